@@ -0,0 +1,19 @@
+from __future__ import annotations
+
+import os
+import secrets
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+# Admin endpoints (and header-triggered profiling) are disabled unless ADMIN_TOKEN is set
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
+
+def is_admin(token: Optional[str]) -> bool:
+    return bool(ADMIN_TOKEN) and secrets.compare_digest(token or "", ADMIN_TOKEN)
+
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)):
+    if not is_admin(x_admin_token):
+        raise HTTPException(403, "admin token required")
@@ -1,14 +1,27 @@
-from typing import Dict, List, Any
-import pandas as pd
+from typing import Callable, Dict, List, Any, Optional, Set
+import logging
+import os
 import re
+import threading
+import time
 from pathlib import Path
 
+from .state import Member
+
 
 BASE_DIR = Path(__file__).parent
-print(BASE_DIR)
 ROSTER_CSV = BASE_DIR / "data/roster.csv"
 MENTORS_CSV = BASE_DIR / "data/mentor.csv"
 
+# csv: roster comes from the CSVs above (per process)
+# mongo: cache over the `teams` collection (see teams.py), CSV fallback
+ROSTER_SOURCE = os.environ.get("ROSTER_SOURCE", "csv").strip().lower()
+# How often (seconds) the background watcher checks the Mongo roster version;
+# requests only ever read the cached roster
+ROSTER_CHECK_SECONDS = float(os.environ.get("ROSTER_CHECK_SECONDS", "30"))
+
+log = logging.getLogger(__name__)
+
 
 def _slugify_member_id(name: str) -> str:
     if "," in name:
@@ -24,7 +37,26 @@ def _slugify_member_id(name: str) -> str:
     return base.strip("_")
 
 
+def _user_id(value: Any) -> Optional[str]:
+    # pandas reads numeric ids as int (or float when the column has gaps)
+    if value is None or value != value:
+        return None
+    if isinstance(value, float):
+        value = int(value)
+    return str(value).strip() or None
+
+
+def split_sections(value: Any) -> tuple:
+    """Canvas lists multiple enrolments as a comma-separated `sections` cell."""
+    if not isinstance(value, str):
+        return ()
+    return tuple(sorted({s.strip() for s in value.split(",") if s.strip()}))
+
+
 def load_team_data() -> Dict[str, Dict[str, Any]]:
+    # pandas is imported here, not at module level, so importing the app stays cheap
+    import pandas as pd
+
     roster = pd.read_csv(ROSTER_CSV)
     mentors = pd.read_csv(MENTORS_CSV)
 
@@ -46,35 +78,143 @@ def load_team_data() -> Dict[str, Dict[str, Any]]:
         seen = set()
 
         for _, row in g.sort_values("name").iterrows():
+            user_id = _user_id(row.get("user_id"))
             mid = _slugify_member_id(row["name"])
             if mid in seen:
-                mid = f"{mid}_{row['user_id']}"
+                mid = f"{mid}_{user_id}"
             seen.add(mid)
 
-            members.append(
-                {"id": mid, "name": row["name"]}
-            )
+            members.append(Member(
+                id=mid,
+                name=row["name"],
+                user_id=user_id,
+                sections=split_sections(row.get("sections")),
+            ))
 
         TEAM_DATA[team_name] = {
             "mentor_name": mentor_name,
-            "members": members,
+            "members": tuple(members),
         }
 
     return TEAM_DATA
 
 
-# Load once at import time (cached)
-TEAM_DATA = load_team_data()
+# Load once on first use (cached); warm_team_data() preloads it off the request path
+_roster_lock = threading.Lock()
+_roster: Dict[str, Any] = {"teams": None, "version": None}
+
+# Called with the names of changed teams when this process picks up a new roster version
+_listeners: List[Callable[[Set[str]], Any]] = []
+
+
+def on_roster_change(callback: Callable[[Set[str]], Any]) -> None:
+    _listeners.append(callback)
+
+
+def _changed_teams(old: Optional[Dict[str, Any]], new: Dict[str, Any]) -> Set[str]:
+    if old is None:
+        return set()
+    return {t for t in old.keys() | new.keys() if old.get(t) != new.get(t)}
+
+
+def _notify(changed: Set[str]) -> None:
+    for callback in _listeners:
+        try:
+            callback(changed)
+        except Exception:
+            log.warning("roster change listener failed", exc_info=True)
+
+
+def _refresh_roster() -> Set[str]:
+    """Reloads the roster if needed; returns the teams that changed."""
+    if ROSTER_SOURCE == "mongo":
+        try:
+            from .teams import roster_version, load_teams
+
+            version = roster_version()
+            if version is not None:
+                changed: Set[str] = set()
+                if version != _roster["version"]:
+                    teams = load_teams()
+                    changed = _changed_teams(_roster["teams"], teams)
+                    _roster["teams"] = teams
+                    _roster["version"] = version
+                return changed
+        except Exception:
+            log.warning("roster version check failed; keeping cached roster", exc_info=True)
+            if _roster["teams"] is not None:
+                return set()
+
+    # csv source, or mongo has never been synced / is unreachable at first load
+    if _roster["teams"] is None:
+        _roster["teams"] = load_team_data()
+        _roster["version"] = "csv"
+    return set()
+
+
+# Loaded on first use (cached); warm_team_data() preloads it off the request path
+def team_data() -> Dict[str, Dict[str, Any]]:
+    if _roster["teams"] is None:
+        with _roster_lock:
+            if _roster["teams"] is None:
+                _refresh_roster()
+    return _roster["teams"]
+
+
+def check_roster() -> Set[str]:
+    """One roster version check; notifies listeners and returns the changed teams."""
+    with _roster_lock:
+        changed = _refresh_roster()
+    if changed:
+        _notify(changed)
+    return changed
+
+
+def replace_roster(teams: Dict[str, Dict[str, Any]], version: str) -> None:
+    """Swaps in an updated roster (incremental ingestion); readers see old or new, never a mix."""
+    with _roster_lock:
+        _roster["teams"] = teams
+        _roster["version"] = version
+
+
+def roster_version() -> Optional[str]:
+    """Version of the roster team_data() currently serves; changes invalidate derived caches."""
+    team_data()
+    return _roster["version"]
+
+
+_watching = threading.Event()
+
+
+def _watch_roster() -> None:
+    team_data()
+    if ROSTER_SOURCE != "mongo":
+        return
+    while True:
+        time.sleep(ROSTER_CHECK_SECONDS)
+        try:
+            check_roster()
+        except Exception:
+            log.warning("roster check failed; serving cached roster", exc_info=True)
+
+
+def warm_team_data() -> None:
+    """Loads the roster in the background and, with the Mongo source, keeps it current."""
+    if _watching.is_set():
+        return
+    _watching.set()
+    threading.Thread(target=_watch_roster, name="roster-watch", daemon=True).start()
 
 
 def list_teams() -> List[str]:
-    return sorted(TEAM_DATA.keys())
+    return sorted(team_data().keys())
 
 
 def get_team(team_name: str) -> Dict[str, Any]:
-    if team_name not in TEAM_DATA:
+    teams = team_data()
+    if team_name not in teams:
         raise KeyError(f"Unknown team: {team_name}")
-    return TEAM_DATA[team_name]
+    return teams[team_name]
 
 
 # from typing import Dict, List, Any
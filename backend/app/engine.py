@@ -1,116 +1,163 @@
 from __future__ import annotations
 
-from typing import Dict, Any, List, Optional
+from functools import lru_cache
+from typing import Collection, Dict, Any, Iterable, Optional, Tuple
+import sys
 import uuid
 
-from .data import list_teams, get_team
-from . import templates
+from .data import get_team, roster_version
+from .state import DEFAULT_SURVEY_ID, INTRO_ITEM, Member, PlanItem, Session
+from .surveys import get_survey
 
 # In-memory storage for MVP
-SESSIONS: Dict[str, Dict[str, Any]] = {}
-
-# Use a URL-safe delimiter for instance ids
-DELIM = "__"
-
-
-def create_session() -> Dict[str, Any]:
-    session_id = str(uuid.uuid4())
-    SESSIONS[session_id] = {
-        "session_id": session_id,
-        "status": "IN_PROGRESS",
-        "answers": {},
-        "meta": {},
-        "plan": [
-            {"instance_id": "intro__1", "kind": "intro", "bindings": {}}
-        ],
-        "cursor": 0,
-    }
-    return SESSIONS[session_id]
+SESSIONS: Dict[str, Session] = {}
 
 
-def materialise_plan(session: Dict[str, Any], team_name: str) -> None:
-    team = get_team(team_name)
-    mentor_name = team.get("mentor_name", "")
-    members = team.get("members", [])
+def create_session(survey_id: str = DEFAULT_SURVEY_ID, session_id: Optional[str] = None) -> Session:
+    get_survey(survey_id)  # KeyError for unknown surveys
+    session_id = session_id or str(uuid.uuid4())
+    SESSIONS[session_id] = Session(session_id=session_id, survey_id=survey_id)
+    return SESSIONS[session_id]
 
-    session["meta"] = {
-        "team_name": team_name,
-        "mentor_name": mentor_name,
-        "members": members,
-    }
 
-    plan: List[Dict[str, Any]] = []
+def team_plan(team_name: str, survey_id: str = DEFAULT_SURVEY_ID) -> Tuple[PlanItem, ...]:
+    """
+    Builds the (immutable) plan for a team once per survey and roster version;
+    every session for that team shares the resulting tuple.
+    """
+    survey = get_survey(survey_id)
+    return _team_plan(survey_id, survey.version, team_name, roster_version())
 
-    # fixed blocks
-    plan.append({"instance_id": f"intro{DELIM}1", "kind": "intro", "bindings": {}})
-    plan.append({"instance_id": f"mentor_confirmation{DELIM}1", "kind": "mentor_confirmation", "bindings": {}})
-    plan.append({"instance_id": f"overall_performance{DELIM}1", "kind": "overall_performance", "bindings": {}})
-    plan.append({"instance_id": f"client_communication{DELIM}1", "kind": "client_communication", "bindings": {}})
 
-    # repeated member blocks
-    for m in members:
-        member_id = m.get("id")
-        member_name = m.get("name")
-        if not member_id or not member_name:
-            # Skip malformed roster entries rather than crashing the whole session
-            continue
+@lru_cache(maxsize=256)
+def _team_plan(survey_id: str, survey_version: str, team_name: str, version: str) -> Tuple[PlanItem, ...]:
+    team = get_team(team_name)
+    return get_survey(survey_id).plan(team.get("members", ()))
 
-        plan.append(
-            {
-                "instance_id": f"member_evaluation{DELIM}{member_id}",
-                "kind": "member_evaluation",
-                "bindings": {"member_id": member_id, "member_name": member_name},
-            }
-        )
 
-    # final
-    plan.append({"instance_id": f"director_comment{DELIM}1", "kind": "director_comment", "bindings": {}})
+def materialise_plan(session: Session, team_name: str, team: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Plans the session for a team of the current roster, or for the given
+    `team` entry (journal replay of a team that has since been dissolved).
+    """
+    if team is None:
+        team = get_team(team_name)
+        plan = team_plan(team_name, session.survey_id)
+    else:
+        plan = get_survey(session.survey_id).plan(team.get("members", ()))
 
-    session["plan"] = plan
+    session.team_name = team_name
+    session.mentor_name = team.get("mentor_name", "")
+    session.members = team.get("members", ())
+    session.plan = plan
 
     # cursor points to the next instance after intro
     # intro is always index 0
-    session["cursor"] = 1
-
-
-def render_instance(session: Dict[str, Any], instance: Dict[str, Any]) -> Dict[str, Any]:
-    kind = instance["kind"]
-    meta = session.get("meta", {})
-    team_name = meta.get("team_name", "")
-    mentor_name = meta.get("mentor_name", "")
-
-    if kind == "intro":
-        block = templates.intro_block(list_teams())
-    elif kind == "mentor_confirmation":
-        block = templates.mentor_confirmation_block(team_name, mentor_name)
-    elif kind == "overall_performance":
-        block = templates.overall_performance_block(team_name)
-    elif kind == "client_communication":
-        block = templates.client_communication_block(team_name)
-    elif kind == "member_evaluation":
-        member_name = instance["bindings"]["member_name"]
-        block = templates.member_evaluation_block(member_name)
-    elif kind == "director_comment":
-        block = templates.director_comment_block(team_name)
-    else:
-        raise ValueError(f"Unknown instance kind: {kind}")
-
-    existing = session["answers"].get(instance["instance_id"], {})
+    session.cursor = 1
+
+
+def restore_plan(
+    session: Session,
+    team_name: str,
+    mentor_name: str,
+    members: Tuple[Member, ...],
+    plan: Iterable[Dict[str, Any]],
+) -> None:
+    """
+    Rebuilds a session from its stored plan (survey_sessions.plan), for a team
+    that is no longer on the roster. Members missing from `members` (sessions
+    stored before it was kept) are named by their id.
+    """
+    by_id = {m.id: m for m in members}
+    items = []
+    for item in plan:
+        member_id = item.get("member_id")
+        member = None
+        if member_id is not None:
+            member = by_id.get(member_id) or Member(id=member_id, name=member_id)
+        items.append(PlanItem(instance_id=item["instance_id"], kind=sys.intern(item["kind"]), member=member))
+
+    session.team_name = team_name
+    session.mentor_name = mentor_name
+    session.members = tuple(members)
+    session.plan = tuple(items)
+
+
+def refresh_session_plan(session: Session) -> None:
+    """
+    Re-materialises a session after its team's roster changed. The cursor
+    moves to the first block of the new plan that was not already behind it,
+    so newly added members are evaluated and removed ones are skipped.
+    """
+    if not session.team_name:
+        return
+    try:
+        team = get_team(session.team_name)
+    except KeyError:
+        # Team dissolved; keep the session as it was materialised
+        return
+
+    done = {item.instance_id for item in session.plan[: session.cursor]}
+    session.mentor_name = team.get("mentor_name", "")
+    session.members = team.get("members", ())
+    session.plan = team_plan(session.team_name, session.survey_id)
+    session.cursor = resume_cursor(session.plan, done)
+
+
+def resume_cursor(plan: Tuple[PlanItem, ...], done: Collection[str]) -> int:
+    """Index of the first block of `plan` whose instance_id is not in `done`."""
+    return next((i for i, item in enumerate(plan) if item.instance_id not in done), len(plan))
+
+
+def render_instance(session: Session, instance: PlanItem) -> Dict[str, Any]:
+    block = get_survey(session.survey_id).render(session, instance)
+
+    existing = session.answers.get(instance.instance_id, {})
 
     return {
-        "instance_id": instance["instance_id"],
+        "instance_id": instance.instance_id,
         "title": block["title"],
         "elements": block["elements"],
         "answers": existing,
     }
 
 
-def next_instance(session: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-    plan = session.get("plan") or []
-    cursor = int(session.get("cursor", 0))
+def apply_answers(
+    session: Session,
+    instance: PlanItem,
+    answers: Dict[str, Any],
+    team: Optional[Dict[str, Any]] = None,
+) -> None:
+    """
+    In-memory effect of posting answers for one instance: merge, materialise
+    the plan on intro, advance the cursor. Callers validate first (instance
+    belongs to the plan, intro names a known team); `team` is passed on to
+    materialise_plan.
+    """
+    instance_id = instance.instance_id
+    session.answers[instance_id] = {**session.answers.get(instance_id, {}), **answers}
+
+    if instance is INTRO_ITEM:
+        materialise_plan(session, session.answers[instance_id]["ProjectTeam"], team)
+
+    # Advance cursor if posting current step
+    if session.plan:
+        current = next_instance(session)
+        if current and current.instance_id == instance_id:
+            session.cursor += 1
+    else:
+        session.cursor = 1
+
+    if next_instance(session) is None and session.status == "IN_PROGRESS":
+        session.status = "COMPLETE"
+
+
+def next_instance(session: Session) -> Optional[PlanItem]:
+    plan = session.plan
+    cursor = session.cursor
     if cursor < 0:
         cursor = 0
-        session["cursor"] = 0
+        session.cursor = 0
     if cursor >= len(plan):
         return None
     return plan[cursor]
@@ -0,0 +1,307 @@
+"""
+Live progress feed: one tail of survey_sessions status changes per process,
+fanned out to every connected dashboard (see GET /reports/progress/stream).
+
+FEED_SOURCE selects where changes come from:
+- auto (default): change stream, falling back to polling when the deployment
+  does not support them (standalone mongod)
+- changestream / poll: force one of the above
+- memory: in-process MemorySource, fed by publish_status() from the
+  endpoints that create, complete or submit a session; for tests and
+  single-process runs without Mongo
+
+Every source reports status transitions only: answer saves that leave the
+status unchanged are not events. Mongo sources keep the last status seen per
+session; a session first seen after the feed started is reported if it was
+created since then or has left IN_PROGRESS.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, Optional, Set, Tuple
+
+from .mongo import get_mongo
+from .persist import slugify, utcnow
+from .reports import STATUSES
+from .state import Session
+
+log = logging.getLogger(__name__)
+
+FEED_SOURCE = os.environ.get("FEED_SOURCE", "auto").strip().lower()
+FEED_POLL_SECONDS = float(os.environ.get("FEED_POLL_SECONDS", "2"))
+# Per-subscriber buffer; a dashboard that falls this far behind loses the oldest events
+FEED_QUEUE_SIZE = 256
+# Sessions whose last status the Mongo sources remember
+FEED_TRACKED_SESSIONS = 100_000
+
+Event = Dict[str, Any]
+Running = Callable[[], bool]
+
+_PROJECTION = {
+    "_id": 0, "session_id": 1, "team_key": 1, "team_name": 1, "status": 1,
+    "created_at": 1, "updated_at": 1, "submitted_at": 1,
+}
+
+
+def _event(doc: Dict[str, Any]) -> Event:
+    return {k: doc.get(k) for k in _PROJECTION if k != "_id"}
+
+
+def _aware(ts: Optional[datetime]) -> Optional[datetime]:
+    # pymongo returns naive UTC datetimes unless the client is tz_aware
+    if ts is not None and ts.tzinfo is None:
+        return ts.replace(tzinfo=timezone.utc)
+    return ts
+
+
+class StatusTransitions:
+    """Last status seen per session (LRU-bounded); passes only documents that change it."""
+
+    def __init__(self, max_sessions: int = FEED_TRACKED_SESSIONS):
+        self.max_sessions = max_sessions
+        self._last: "OrderedDict[str, str]" = OrderedDict()
+        self._since = utcnow()
+
+    def reset(self) -> None:
+        self._last.clear()
+        self._since = utcnow()
+
+    def changed(self, doc: Dict[str, Any]) -> bool:
+        status = doc.get("status")
+        previous = self._last.pop(doc.get("session_id"), None)
+        self._last[doc.get("session_id")] = status
+        if len(self._last) > self.max_sessions:
+            self._last.popitem(last=False)
+        if previous is not None:
+            return previous != status
+        created = _aware(doc.get("created_at"))
+        return status != "IN_PROGRESS" or (created is not None and created >= self._since)
+
+
+class ChangeStreamSource:
+    """Tails a change stream, resuming from the last token after errors."""
+
+    def __init__(self):
+        self._token = None
+        self._transitions = StatusTransitions()
+
+    def reset(self) -> None:
+        self._token = None
+        self._transitions.reset()
+
+    def events(self, running: Running) -> Iterator[Event]:
+        pipeline = [
+            {"$match": {"$or": [
+                {"operationType": {"$in": ["insert", "replace"]}},
+                {"operationType": "update", "updateDescription.updatedFields.status": {"$exists": True}},
+            ]}},
+        ]
+        with get_mongo().survey_sessions.watch(
+            pipeline,
+            full_document="updateLookup",
+            max_await_time_ms=1000,
+            resume_after=self._token,
+        ) as stream:
+            while running():
+                change = stream.try_next()
+                if change is None:
+                    continue
+                self._token = stream.resume_token
+                doc = change.get("fullDocument")
+                if doc and self._transitions.changed(doc):
+                    yield _event(doc)
+
+
+class PollingSource:
+    """
+    Polls the (status, updated_at) index for documents updated since the last
+    poll and reports those whose status changed. Pages are keyed on
+    (updated_at, _id), so many saves within the same millisecond are not lost
+    at a page boundary.
+    """
+
+    page_size = 500
+
+    def __init__(self, interval: float = FEED_POLL_SECONDS):
+        self.interval = interval
+        self._since = utcnow()
+        self._last_id: Any = None
+        self._transitions = StatusTransitions()
+
+    def reset(self) -> None:
+        self._since = utcnow()
+        self._last_id = None
+        self._transitions.reset()
+
+    def _after(self) -> Dict[str, Any]:
+        if self._last_id is None:
+            return {"updated_at": {"$gt": self._since}}
+        return {"$or": [
+            {"updated_at": {"$gt": self._since}},
+            {"updated_at": self._since, "_id": {"$gt": self._last_id}},
+        ]}
+
+    def events(self, running: Running) -> Iterator[Event]:
+        coll = get_mongo().survey_sessions
+        projection = {**_PROJECTION, "_id": 1}
+        while running():
+            cursor = (
+                coll.find({"status": {"$in": list(STATUSES)}, **self._after()}, projection)
+                .sort([("updated_at", 1), ("_id", 1)])
+                .limit(self.page_size)
+            )
+            n = 0
+            for doc in cursor:
+                self._since = doc["updated_at"]
+                self._last_id = doc["_id"]
+                n += 1
+                if self._transitions.changed(doc):
+                    yield _event(doc)
+            if n < self.page_size:
+                time.sleep(self.interval)
+
+
+class AutoSource:
+    """Change stream when supported, otherwise polling for the life of the process."""
+
+    def __init__(self):
+        self._inner: Any = ChangeStreamSource()
+
+    def reset(self) -> None:
+        self._inner.reset()
+
+    def events(self, running: Running) -> Iterator[Event]:
+        from pymongo.errors import OperationFailure
+
+        try:
+            yield from self._inner.events(running)
+        except OperationFailure as e:
+            # 40573: "The $changeStream stage is only supported on replica sets"
+            if not isinstance(self._inner, ChangeStreamSource) or e.code != 40573:
+                raise
+            log.info("change streams unavailable (%s); polling instead", e.code)
+            self._inner = PollingSource()
+
+
+class MemorySource:
+    """In-process source: whatever is publish()ed is delivered to subscribers."""
+
+    def __init__(self):
+        self._q: "queue.Queue[Event]" = queue.Queue(maxsize=FEED_QUEUE_SIZE)
+
+    def reset(self) -> None:
+        # Events published while nobody listened are not replayed
+        while True:
+            try:
+                self._q.get_nowait()
+            except queue.Empty:
+                return
+
+    def publish(self, event: Event) -> None:
+        try:
+            self._q.put_nowait(event)
+        except queue.Full:
+            pass
+
+    def events(self, running: Running) -> Iterator[Event]:
+        while running():
+            try:
+                yield self._q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+
+def _make_source():
+    if FEED_SOURCE == "memory":
+        return MemorySource()
+    if FEED_SOURCE == "poll":
+        return PollingSource()
+    if FEED_SOURCE == "changestream":
+        return ChangeStreamSource()
+    if FEED_SOURCE == "auto":
+        return AutoSource()
+    raise ValueError(f"Unknown FEED_SOURCE: {FEED_SOURCE}")
+
+
+def _offer(q: "asyncio.Queue[Event]", event: Event) -> None:
+    if q.full():
+        q.get_nowait()
+    q.put_nowait(event)
+
+
+class ProgressFeed:
+    """
+    Shared tail. The reader thread starts with the first subscriber and stops
+    once the last one leaves, so idle workers hold no cursor.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self._subscribers: Set[Tuple[asyncio.AbstractEventLoop, "asyncio.Queue[Event]"]] = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def subscribe(self) -> "asyncio.Queue[Event]":
+        q: "asyncio.Queue[Event]" = asyncio.Queue(maxsize=FEED_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add((asyncio.get_running_loop(), q))
+            if self._thread is None:
+                # Start from "now": nothing is replayed from before the feed went idle
+                self.source.reset()
+                self._thread = threading.Thread(target=self._run, name="progress-feed", daemon=True)
+                self._thread.start()
+        return q
+
+    def unsubscribe(self, q: "asyncio.Queue[Event]") -> None:
+        with self._lock:
+            self._subscribers = {(loop, sq) for loop, sq in self._subscribers if sq is not q}
+
+    def _running(self) -> bool:
+        return bool(self._subscribers)
+
+    def _publish(self, event: Event) -> None:
+        for loop, q in list(self._subscribers):
+            loop.call_soon_threadsafe(_offer, q, event)
+
+    def _run(self) -> None:
+        while True:
+            try:
+                for event in self.source.events(self._running):
+                    self._publish(event)
+            except Exception:
+                log.warning("progress feed source failed; retrying", exc_info=True)
+                time.sleep(1.0)
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    return
+
+
+FEED = ProgressFeed(_make_source())
+
+
+def publish_status(session: Session, submitted_at: Optional[datetime] = None) -> None:
+    """
+    Reports a session's new status to the in-process source. Mongo-backed
+    sources pick status changes up from survey_sessions instead.
+    """
+    source = FEED.source
+    if not isinstance(source, MemorySource):
+        return
+    now = utcnow()
+    source.publish({
+        "session_id": session.session_id,
+        "team_key": slugify(session.team_name) if session.team_name else None,
+        "team_name": session.team_name,
+        "status": session.status,
+        "created_at": None,
+        "updated_at": now,
+        "submitted_at": submitted_at,
+    })
@@ -0,0 +1,303 @@
+"""
+Incremental roster ingestion from Canvas-style exports (the roster.csv
+columns: name, canvas_user_id, user_id, sections, group_name, ...).
+
+The export is streamed in chunks, collapsed to one entry per user_id (a
+student enrolled in several sections appears once per section), and diffed
+against the current roster by user_id into adds / moves / removes. Only the
+affected teams are rebuilt, and in-progress sessions of those teams get their
+plan refreshed.
+
+An export only speaks for the sections it contains: a student missing from
+it loses just those sections and leaves their team only when no other section
+is left, and a student it lists keeps their enrolments in other sections.
+Pass full=True for an export that covers the whole cohort.
+
+    python -m app.ingest export.csv [--full] [--dry-run]
+
+With ROSTER_SOURCE=mongo the export is diffed against the roster published in
+Mongo, the result is synced to the teams collection under the roster lease
+(teams.roster_lock) and every worker picks it up through the roster version.
+With the CSV source an ingest would only affect the ingesting process, so the
+CLI only shows the diff and POST /admin/roster applies it only when sessions
+are process-local (a single worker, see serve.py). Sessions
+held in memory are re-planned by the ingesting process directly and by every
+other worker once it sees the new roster version (data.on_roster_change).
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import sys
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from itertools import count, islice
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .data import (
+    MENTORS_CSV,
+    ROSTER_SOURCE,
+    _slugify_member_id,
+    replace_roster,
+    split_sections,
+    team_data,
+)
+from .state import Member
+from .store import refresh_sessions
+
+CHUNK_ROWS = 5000
+
+# Roster versions for process-local (CSV source) ingests
+_local_versions = count(1)
+
+
+@dataclass
+class Incoming:
+    name: str
+    team_name: Optional[str]
+    sections: Set[str] = field(default_factory=set)
+
+
+@dataclass
+class RosterDiff:
+    adds: List[Tuple[str, Incoming]] = field(default_factory=list)  # (user_id, incoming)
+    moves: List[Tuple[str, str, Incoming]] = field(default_factory=list)  # (user_id, from team, incoming)
+    removes: List[Tuple[str, str]] = field(default_factory=list)  # (user_id, from team)
+
+    def affected_teams(self) -> Set[str]:
+        teams = {inc.team_name for _, inc in self.adds}
+        teams |= {t for _, t, _ in self.moves} | {inc.team_name for _, _, inc in self.moves}
+        teams |= {t for _, t in self.removes}
+        teams.discard(None)
+        return teams
+
+    def summary(self) -> Dict[str, int]:
+        return {"adds": len(self.adds), "moves": len(self.moves), "removes": len(self.removes)}
+
+
+def _chunks(rows: Iterable[Dict[str, str]], size: int) -> Iterator[List[Dict[str, str]]]:
+    it = iter(rows)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def read_export(stream: Iterable[str], chunk_rows: int = CHUNK_ROWS) -> Tuple[Dict[str, Incoming], Set[str]]:
+    """Returns user_id -> Incoming (sections merged across rows) and the sections seen."""
+    incoming: Dict[str, Incoming] = {}
+    seen_sections: Set[str] = set()
+
+    for chunk in _chunks(csv.DictReader(stream), chunk_rows):
+        for row in chunk:
+            uid = (row.get("user_id") or "").strip()
+            name = (row.get("name") or "").strip()
+            if not uid or not name:
+                continue
+            group = (row.get("group_name") or "").strip()
+            sections = split_sections(row.get("sections"))
+            seen_sections.update(sections)
+
+            entry = incoming.get(uid)
+            if entry is None:
+                incoming[uid] = entry = Incoming(name=name, team_name=None)
+            entry.name = name
+            entry.sections.update(sections)
+            if group:
+                entry.team_name = f"Team {group}"
+
+    return incoming, seen_sections
+
+
+def roster_index(teams: Dict[str, Dict[str, Any]]) -> Dict[str, Tuple[str, Member]]:
+    return {
+        m.user_id: (team_name, m)
+        for team_name, team in teams.items()
+        for m in team.get("members", ())
+        if m.user_id
+    }
+
+
+def diff_roster(
+    index: Dict[str, Tuple[str, Member]],
+    incoming: Dict[str, Incoming],
+    export_sections: Set[str],
+    full: bool = False,
+) -> RosterDiff:
+    diff = RosterDiff()
+    for uid, inc in incoming.items():
+        current = index.get(uid)
+        if current is None:
+            if inc.team_name:
+                diff.adds.append((uid, inc))
+            continue
+        team_name, member = current
+        if inc.team_name is None:
+            diff.removes.append((uid, team_name))
+            continue
+        if not full:
+            # Enrolments in sections outside the export are kept as they are
+            inc = Incoming(inc.name, inc.team_name, inc.sections | (set(member.sections) - export_sections))
+        if inc.team_name != team_name or inc.name != member.name or tuple(sorted(inc.sections)) != member.sections:
+            diff.moves.append((uid, team_name, inc))
+
+    for uid, (team_name, member) in index.items():
+        if uid in incoming:
+            continue
+        if full:
+            diff.removes.append((uid, team_name))
+            continue
+        kept = set(member.sections) - export_sections
+        if len(kept) == len(member.sections):
+            continue  # none of their sections are in this export
+        if kept:
+            diff.moves.append((uid, team_name, Incoming(member.name, team_name, kept)))
+        else:
+            diff.removes.append((uid, team_name))
+    return diff
+
+
+def _mentors() -> Dict[str, str]:
+    with MENTORS_CSV.open(newline="", encoding="utf-8") as fh:
+        return {
+            f"Team {row['group_name'].strip()}": row["mentor_name"].strip()
+            for row in csv.DictReader(fh)
+            if row.get("group_name") and row.get("mentor_name")
+        }
+
+
+def apply_diff(
+    teams: Dict[str, Dict[str, Any]],
+    diff: RosterDiff,
+    index: Dict[str, Tuple[str, Member]],
+) -> Dict[str, Dict[str, Any]]:
+    """Copy-on-write: returns a new roster sharing every unaffected team."""
+    leaving: Dict[str, Set[str]] = {}
+    arriving: Dict[str, List[Tuple[str, Incoming, Optional[Member]]]] = {}
+
+    for uid, team_name in diff.removes:
+        leaving.setdefault(team_name, set()).add(uid)
+    for uid, from_team, inc in diff.moves:
+        leaving.setdefault(from_team, set()).add(uid)
+        arriving.setdefault(inc.team_name, []).append((uid, inc, index[uid][1]))
+    for uid, inc in diff.adds:
+        arriving.setdefault(inc.team_name, []).append((uid, inc, None))
+
+    mentors: Optional[Dict[str, str]] = None
+    out = dict(teams)
+    for team_name in diff.affected_teams():
+        team = teams.get(team_name)
+        if team is None:
+            if mentors is None:
+                mentors = _mentors()
+            team = {"mentor_name": mentors.get(team_name, ""), "members": ()}
+
+        gone = leaving.get(team_name, set())
+        members = [m for m in team["members"] if m.user_id not in gone]
+        taken = {m.id for m in members}
+        for uid, inc, previous in arriving.get(team_name, []):
+            # Keep a moved/renamed student's id (answers are keyed by it) unless it clashes
+            mid = previous.id if previous is not None else _slugify_member_id(inc.name)
+            if mid in taken:
+                mid = f"{_slugify_member_id(inc.name)}_{uid}"
+            taken.add(mid)
+            members.append(Member(id=mid, name=inc.name, user_id=uid, sections=tuple(sorted(inc.sections))))
+
+        if members:
+            out[team_name] = {**team, "members": tuple(sorted(members, key=lambda m: m.name))}
+        else:
+            out.pop(team_name, None)
+    return out
+
+
+def _published_roster() -> Tuple[Dict[str, Dict[str, Any]], Optional[str]]:
+    """
+    Roster to diff against and its version: with ROSTER_SOURCE=mongo the
+    published one (this process's cache may be behind), else team_data().
+    """
+    if ROSTER_SOURCE == "mongo":
+        from .teams import load_teams, roster_version
+
+        version = roster_version()
+        if version is not None:
+            return load_teams(), version
+    return team_data(), None
+
+
+def ingest_roster(stream: Iterable[str], full: bool = False, dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Diffs an export against the roster and, unless dry_run, applies it. With
+    ROSTER_SOURCE=mongo, applying holds teams.roster_lock() and raises
+    teams.RosterConflict if another writer holds it or publishes first.
+    """
+    if ROSTER_SOURCE == "mongo" and not dry_run:
+        from .teams import roster_lock
+
+        lock = roster_lock()
+    else:
+        lock = nullcontext()
+    with lock:
+        return _ingest(stream, full, dry_run)
+
+
+def _ingest(stream: Iterable[str], full: bool, dry_run: bool) -> Dict[str, Any]:
+    started = time.perf_counter()
+    current, base_version = _published_roster()
+    index = roster_index(current)
+    incoming, sections = read_export(stream)
+    diff = diff_roster(index, incoming, sections, full=full)
+    affected = diff.affected_teams()
+
+    refreshed = 0
+    if not dry_run and affected:
+        updated = apply_diff(current, diff, index)
+        if ROSTER_SOURCE == "mongo":
+            from .teams import sync_teams
+
+            # Never synced: `current` came from the CSV, so write every team
+            only = affected & set(updated) if base_version is not None else None
+            version = sync_teams(updated, base_version, only=only)
+        else:
+            version = f"ingest-{next(_local_versions)}"
+        replace_roster(updated, version)
+        refreshed = refresh_sessions(affected)
+
+    return {
+        **diff.summary(),
+        "rows": len(incoming),
+        "teams_affected": sorted(t for t in affected if t),
+        "sessions_refreshed": refreshed,
+        "dry_run": dry_run,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.ingest", description="Ingest a Canvas roster export.")
+    parser.add_argument("export", type=Path)
+    parser.add_argument("--full", action="store_true", help="export covers every section; remove anyone missing")
+    parser.add_argument("--dry-run", action="store_true", help="print the diff only")
+    args = parser.parse_args(argv)
+
+    if ROSTER_SOURCE != "mongo" and not args.dry_run:
+        print("ROSTER_SOURCE is not mongo: changes would only live in this process; showing the diff only")
+        args.dry_run = True
+
+    from .teams import RosterConflict
+
+    with args.export.open(newline="", encoding="utf-8-sig") as fh:
+        try:
+            result = ingest_roster(fh, full=args.full, dry_run=args.dry_run)
+        except RosterConflict as e:
+            print(f"not applied: {e}")
+            return 1
+    for k, v in result.items():
+        print(f"{k}: {v}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,357 @@
+"""
+Local append-only answer journal (SESSION_STORE=journal, single process per
+JOURNAL_DIR, enforced by an exclusive lock on JOURNAL_DIR/lock).
+
+Every session mutation is appended as one JSON line to the active segment
+(seg-<n>.log) before it is applied in memory. Writers are group-committed: an
+append returns once a batched fsync (every JOURNAL_FSYNC_MS, 0 = per append)
+covers it, so the hot path never waits on Mongo.
+
+- Mutations are applied under Journal.apply_lock, and JournalReplayer copies
+  a session under the same lock, so a snapshot never sees a half-applied
+  mutation.
+- JournalReplayer drains journaled sessions into survey_sessions in the
+  background (full snapshots stamped with the sync time, so it is idempotent)
+  and advances `checkpoint`. While Mongo is down records simply stay pending.
+- rebuild_sessions() replays retained segments at startup to restore
+  engine.SESSIONS after a pod restart. Records of a session whose create
+  record was pruned are applied on top of its survey_sessions document.
+- Segments that are fully replayed and older than JOURNAL_RETAIN_SECONDS are
+  deleted.
+"""
+from __future__ import annotations
+
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import replace
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from .data import get_team
+from .engine import SESSIONS, apply_answers, create_session, refresh_session_plan
+from .persist import save_session_snapshot, utcnow
+from .state import DEFAULT_SURVEY_ID, INTRO_ITEM, Member, Session
+
+log = logging.getLogger(__name__)
+
+JOURNAL_DIR = Path(os.environ.get("JOURNAL_DIR", "journal"))
+JOURNAL_SEGMENT_BYTES = int(os.environ.get("JOURNAL_SEGMENT_BYTES", str(8 * 2**20)))
+JOURNAL_FSYNC_MS = float(os.environ.get("JOURNAL_FSYNC_MS", "5"))
+JOURNAL_REPLAY_SECONDS = float(os.environ.get("JOURNAL_REPLAY_SECONDS", "1"))
+JOURNAL_RETAIN_SECONDS = float(os.environ.get("JOURNAL_RETAIN_SECONDS", "86400"))
+
+Record = Dict[str, Any]
+Loader = Callable[[str], Optional[Session]]
+
+
+def _segment_name(n: int) -> str:
+    return f"seg-{n:08d}.log"
+
+
+def _read_segment(path: Path) -> List[Record]:
+    records = []
+    with path.open("rb") as fh:
+        for line in fh:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # Torn tail of a crashed write: nothing after it was acknowledged
+                log.warning("journal %s: ignoring unreadable record", path.name)
+                break
+    return records
+
+
+class Journal:
+    def __init__(
+        self,
+        directory: Path = JOURNAL_DIR,
+        segment_bytes: int = JOURNAL_SEGMENT_BYTES,
+        fsync_ms: float = JOURNAL_FSYNC_MS,
+    ):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_ms / 1000.0
+        self._lock = threading.Lock()
+        self._synced = threading.Condition(self._lock)
+        # Held while a journaled mutation is applied to its in-memory session
+        self.apply_lock = threading.Lock()
+        self._fh = None
+        self._segment = 0
+        self._seq = 0
+        self._synced_seq = 0
+        self._segment_last_seq: Dict[Path, int] = {}
+        self._pending: List[Record] = []
+        # Appended but not yet applied in memory; replay must not pass these
+        self._inflight: Set[int] = set()
+        self.checkpoint = 0
+        self._closed = False
+        self._lock_fh = None
+
+    # -- lifecycle ---------------------------------------------------------
+
+    def open(self) -> List[Record]:
+        """Reads retained segments, starts a fresh segment; returns all records."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._acquire_dir_lock()
+        cp = self.directory / "checkpoint"
+        self.checkpoint = int(cp.read_text().strip() or 0) if cp.exists() else 0
+
+        records: List[Record] = []
+        for path in sorted(self.directory.glob("seg-*.log")):
+            seg = _read_segment(path)
+            if seg:
+                self._segment_last_seq[path] = seg[-1]["seq"]
+            self._segment = max(self._segment, int(path.stem.split("-")[1]))
+            records.extend(seg)
+
+        self._seq = self._synced_seq = max([self.checkpoint] + [r["seq"] for r in records])
+        self._pending = [r for r in records if r["seq"] > self.checkpoint]
+
+        # Never append after a possibly torn line
+        self._open_segment(self._segment + 1)
+        if self.fsync_interval > 0:
+            threading.Thread(target=self._flusher, name="journal-fsync", daemon=True).start()
+        return records
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            if self._fh is not None:
+                self._fh.flush()
+                os.fsync(self._fh.fileno())
+                self._fh.close()
+                self._fh = None
+            self._synced_seq = self._seq
+            self._synced.notify_all()
+            if self._lock_fh is not None:
+                self._lock_fh.close()  # releases the flock
+                self._lock_fh = None
+
+    def _acquire_dir_lock(self) -> None:
+        # Held for the life of the process; the OS drops it if the process dies
+        fh = (self.directory / "lock").open("a")
+        try:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            fh.close()
+            raise RuntimeError(f"journal {self.directory} is in use by another process")
+        self._lock_fh = fh
+
+    def _open_segment(self, n: int) -> None:
+        self._segment = n
+        self._path = self.directory / _segment_name(n)
+        self._fh = self._path.open("ab")
+
+    # -- writes ------------------------------------------------------------
+
+    def append(self, op: str, session_id: str, **fields: Any) -> int:
+        """Durably appends one record; returns its sequence number."""
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            record = {"seq": seq, "ts": time.time(), "op": op, "session_id": session_id, **fields}
+            self._fh.write(json.dumps(record, separators=(",", ":")).encode("utf-8") + b"\n")
+            self._fh.flush()
+            self._segment_last_seq[self._path] = seq
+            self._pending.append(record)
+            self._inflight.add(seq)
+
+            if self._fh.tell() >= self.segment_bytes:
+                os.fsync(self._fh.fileno())
+                self._fh.close()
+                self._synced_seq = seq
+                self._synced.notify_all()
+                self._open_segment(self._segment + 1)
+            elif self.fsync_interval <= 0:
+                os.fsync(self._fh.fileno())
+                self._synced_seq = seq
+            else:
+                while self._synced_seq < seq and not self._closed:
+                    self._synced.wait()
+            return seq
+
+    def _flusher(self) -> None:
+        while not self._closed:
+            time.sleep(self.fsync_interval)
+            with self._lock:
+                if self._closed or self._synced_seq >= self._seq:
+                    continue
+                os.fsync(self._fh.fileno())
+                self._synced_seq = self._seq
+                self._synced.notify_all()
+
+    # -- replay bookkeeping ------------------------------------------------
+
+    def applied(self, seq: int) -> None:
+        with self._lock:
+            self._inflight.discard(seq)
+
+    def pending(self) -> List[Record]:
+        """Records not yet in Mongo whose mutation has already been applied in memory."""
+        with self._lock:
+            if not self._inflight:
+                return list(self._pending)
+            boundary = min(self._inflight)
+            return [r for r in self._pending if r["seq"] < boundary]
+
+    def ack(self, seq: int) -> None:
+        """Marks everything up to seq as synced to Mongo and prunes old segments."""
+        with self._lock:
+            self._pending = [r for r in self._pending if r["seq"] > seq]
+            self.checkpoint = max(self.checkpoint, seq)
+            tmp = self.directory / "checkpoint.tmp"
+            tmp.write_text(str(self.checkpoint))
+            os.replace(tmp, self.directory / "checkpoint")
+
+            cutoff = time.time() - JOURNAL_RETAIN_SECONDS
+            for path, last in list(self._segment_last_seq.items()):
+                if path != self._path and last <= self.checkpoint and path.stat().st_mtime < cutoff:
+                    path.unlink(missing_ok=True)
+                    del self._segment_last_seq[path]
+
+
+def team_record(team: Dict[str, Any]) -> Dict[str, Any]:
+    """Roster entry journaled with an intro, so replay can plan a team dissolved since."""
+    mentor_name = team.get("mentor_name")
+    return {
+        "mentor_name": mentor_name if isinstance(mentor_name, str) else "",
+        "members": [m.to_roster_dict() for m in team.get("members", ())],
+    }
+
+
+def _replay_team(s: Session, record: Record) -> Optional[Dict[str, Any]]:
+    """The journaled team of an intro record whose team is no longer on the roster."""
+    recorded = record.get("team")
+    if recorded is None:
+        return None
+    team_name = {**s.answers.get(INTRO_ITEM.instance_id, {}), **record["answers"]}.get("ProjectTeam")
+    try:
+        get_team(team_name)
+        return None
+    except KeyError:
+        return {
+            "mentor_name": recorded["mentor_name"],
+            "members": tuple(Member.from_roster_dict(m) for m in recorded["members"]),
+        }
+
+
+def apply_record(record: Record, load: Optional[Loader] = None) -> None:
+    """
+    Re-applies one journal record to engine.SESSIONS (startup recovery).
+    `load` fetches a session whose create record was pruned.
+    """
+    sid = record["session_id"]
+    op = record["op"]
+    if op == "create":
+        create_session(record.get("survey_id") or DEFAULT_SURVEY_ID, session_id=sid)
+        return
+
+    s = SESSIONS.get(sid)
+    if s is None:
+        s = load(sid) if load is not None else None
+        if s is None:
+            return
+        SESSIONS[sid] = s
+    if op == "answers":
+        iid = record["instance_id"]
+        inst = INTRO_ITEM if iid == INTRO_ITEM.instance_id else s.find(iid)
+        if inst is INTRO_ITEM:
+            apply_answers(s, inst, record["answers"], _replay_team(s, record))
+        elif inst is not None:
+            apply_answers(s, inst, record["answers"])
+    elif op == "submit":
+        s.status = "SUBMITTED"
+    elif op == "refresh":
+        # Replanned against the roster of now, which is the closest we have
+        refresh_session_plan(s)
+
+
+def rebuild_sessions(records: List[Record], checkpoint: int = 0, load: Optional[Loader] = None) -> int:
+    """
+    Replays records in order. Sessions without a retained create record are
+    loaded with `load`; survey_sessions already holds everything up to
+    `checkpoint`, so only later records are applied to them.
+    """
+    created = {r["session_id"] for r in records if r["op"] == "create"}
+    n = 0
+    for record in records:
+        if record["session_id"] not in created and record["seq"] <= checkpoint:
+            continue
+        try:
+            apply_record(record, load)
+            n += 1
+        except Exception:
+            log.warning("journal: could not replay record %s", record.get("seq"), exc_info=True)
+    return n
+
+
+def _utc(ts: float) -> datetime:
+    return datetime.fromtimestamp(ts, tz=timezone.utc)
+
+
+class JournalReplayer:
+    """Background drain of pending journal records into survey_sessions."""
+
+    def __init__(self, journal: Journal, interval: float = JOURNAL_REPLAY_SECONDS):
+        self.journal = journal
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="journal-replay", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        try:
+            self.drain_once()
+        except Exception:
+            log.warning("journal replay at shutdown failed; records stay pending", exc_info=True)
+
+    def _run(self) -> None:
+        backoff = self.interval
+        while not self._stop.wait(backoff):
+            try:
+                self.drain_once()
+                backoff = self.interval
+            except Exception:
+                # Mongo unavailable: keep records pending and retry, up to every 30s
+                log.warning("journal replay failed; will retry", exc_info=True)
+                backoff = min(backoff * 2, 30.0)
+
+    def drain_once(self) -> int:
+        records = self.journal.pending()
+        if not records:
+            return 0
+
+        submitted: Dict[str, Optional[float]] = {}
+        for r in records:
+            submitted.setdefault(r["session_id"], None)
+            if r["op"] == "submit":
+                submitted[r["session_id"]] = r["ts"]
+
+        for sid, submitted_ts in submitted.items():
+            s = SESSIONS.get(sid)
+            if s is None:
+                continue
+            # Consistent copy (answers blocks are replaced, never mutated in place)
+            with self.journal.apply_lock:
+                snapshot = replace(s, answers=dict(s.answers))
+            # updated_at is the sync time: the IN_PROGRESS TTL counts from when
+            # Mongo got the document, not from when it was journaled
+            save_session_snapshot(
+                snapshot,
+                updated_at=utcnow(),
+                submitted_at=_utc(submitted_ts) if submitted_ts is not None else None,
+            )
+
+        self.journal.ack(records[-1]["seq"])
+        return len(submitted)
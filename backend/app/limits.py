@@ -0,0 +1,204 @@
+"""
+Rate limiting and admission control for the survey and intake endpoints.
+
+Rate limits are token buckets keyed by (limit name, client IP). Each limit is
+"<burst>/<seconds>" (burst tokens, refilled at burst/seconds per second) and
+can be overridden with RATE_LIMIT_<NAME>, e.g. RATE_LIMIT_SESSIONS=20/60.
+RATE_LIMIT_BACKEND picks where buckets live:
+- memory (default): per process
+- mongo: shared by all workers/nodes (rate_limits collection, one atomic
+  update per check). Each check is bounded by RATE_LIMIT_MONGO_TIMEOUT_MS
+  (default 100) and holds an admission slot; when Mongo fails, or no slot is
+  free, the check uses per-process buckets instead, and after a failure Mongo
+  is not tried again for RATE_LIMIT_BREAKER_SECONDS (default 30).
+Exceeding a limit returns 429 with Retry-After.
+
+Clients are keyed by the address uvicorn reports, which is the proxy's own
+address unless the proxy is listed in FORWARDED_ALLOW_IPS (see serve.py).
+
+Admission control sheds Mongo-bound requests with 503 once this process is
+near its connection pool: when in-flight Mongo commands (all threads) or
+admitted Mongo-bound requests reach ADMISSION_HIGH_WATER (default 80% of
+mongo.MAX_POOL_SIZE).
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, Tuple
+
+from fastapi import HTTPException, Request
+
+from .mongo import IN_FLIGHT_OPS, MAX_POOL_SIZE, get_mongo
+from .persist import utcnow
+
+log = logging.getLogger(__name__)
+
+# name -> default "<burst>/<seconds>"
+LIMITS: Dict[str, str] = {
+    "sessions": "10/60",
+    "answers": "120/60",
+    "submit": "10/60",
+    "intake": "5/300",
+}
+
+RATE_LIMIT_MAX_KEYS = int(os.environ.get("RATE_LIMIT_MAX_KEYS", "100000"))
+ADMISSION_HIGH_WATER = int(os.environ.get("ADMISSION_HIGH_WATER", str(int(MAX_POOL_SIZE * 0.8))))
+RATE_LIMIT_MONGO_TIMEOUT_MS = float(os.environ.get("RATE_LIMIT_MONGO_TIMEOUT_MS", "100"))
+RATE_LIMIT_BREAKER_SECONDS = float(os.environ.get("RATE_LIMIT_BREAKER_SECONDS", "30"))
+
+
+def parse_limit(spec: str) -> Tuple[float, float]:
+    """'<burst>/<seconds>' -> (burst, tokens per second)."""
+    burst, seconds = spec.split("/", 1)
+    return float(burst), float(burst) / float(seconds)
+
+
+class Admission:
+    """Tracks admitted Mongo-bound requests and sheds new ones near pool capacity."""
+
+    def __init__(self, high_water: int = ADMISSION_HIGH_WATER):
+        self.high_water = high_water
+        self._lock = threading.Lock()
+        self.admitted = 0
+
+    def try_enter(self) -> bool:
+        with self._lock:
+            if self.admitted >= self.high_water or IN_FLIGHT_OPS.value >= self.high_water:
+                return False
+            self.admitted += 1
+            return True
+
+    def leave(self) -> None:
+        with self._lock:
+            self.admitted -= 1
+
+    def __call__(self) -> Iterator[None]:
+        if not self.try_enter():
+            raise HTTPException(503, "server busy, retry shortly", headers={"Retry-After": "1"})
+        try:
+            yield
+        finally:
+            self.leave()
+
+
+ADMISSION = Admission()
+
+
+class MemoryBackend:
+    """Per-process buckets; least recently used keys are evicted past max_keys."""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, burst: float, rate: float) -> float:
+        """Takes one token; returns 0 if allowed, else seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, ts = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - ts) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+class MongoBackend:
+    """
+    Buckets shared across processes; refill and take happen in one atomic
+    update. Falls back to per-process buckets rather than waiting on Mongo.
+    """
+
+    def __init__(
+        self,
+        timeout_ms: float = RATE_LIMIT_MONGO_TIMEOUT_MS,
+        breaker_seconds: float = RATE_LIMIT_BREAKER_SECONDS,
+        admission: Admission = ADMISSION,
+    ):
+        self.timeout = timeout_ms / 1000.0
+        self.breaker_seconds = breaker_seconds
+        self.admission = admission
+        self.local = MemoryBackend()
+        self._open_until = 0.0
+
+    def take(self, key: str, burst: float, rate: float) -> float:
+        from pymongo.errors import PyMongoError
+
+        if time.monotonic() < self._open_until or not self.admission.try_enter():
+            return self.local.take(key, burst, rate)
+        try:
+            return self._take(key, burst, rate)
+        except PyMongoError as e:
+            self._open_until = time.monotonic() + self.breaker_seconds
+            log.warning("shared rate limits unavailable (%s); per-process limits for %.0fs", type(e).__name__, self.breaker_seconds)
+            return self.local.take(key, burst, rate)
+        finally:
+            self.admission.leave()
+
+    def _take(self, key: str, burst: float, rate: float) -> float:
+        import pymongo
+        from pymongo import ReturnDocument
+
+        now = utcnow()
+        elapsed = {"$divide": [{"$subtract": [now, {"$ifNull": ["$ts", now]}]}, 1000]}
+        # Bounds server selection too, so an unreachable Mongo costs one timeout, not 3s
+        with pymongo.timeout(self.timeout):
+            doc = get_mongo().rate_limits.find_one_and_update(
+                {"_id": key},
+                [
+                    {"$set": {
+                        "tokens": {"$min": [burst, {"$add": [{"$ifNull": ["$tokens", burst]}, {"$multiply": [elapsed, rate]}]}]},
+                        "ts": now,
+                    }},
+                    {"$set": {"allowed": {"$gte": ["$tokens", 1]}}},
+                    {"$set": {"tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", 1]}, "$tokens"]}}},
+                ],
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        if doc["allowed"]:
+            return 0.0
+        return (1 - doc["tokens"]) / rate
+
+
+def _make_backend():
+    kind = os.environ.get("RATE_LIMIT_BACKEND", "memory").strip().lower()
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "mongo":
+        return MongoBackend()
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {kind}")
+
+
+BACKEND = _make_backend()
+
+
+def client_key(request: Request) -> str:
+    # uvicorn resolves X-Forwarded-For only for proxies in FORWARDED_ALLOW_IPS (app.serve)
+    return request.client.host if request.client else "unknown"
+
+
+def rate_limit(name: str) -> Callable[[Request], None]:
+    """FastAPI dependency enforcing LIMITS[name] per client."""
+    burst, rate = parse_limit(os.environ.get(f"RATE_LIMIT_{name.upper()}", LIMITS[name]))
+
+    def check(request: Request) -> None:
+        try:
+            wait = BACKEND.take(f"{name}:{client_key(request)}", burst, rate)
+        except Exception:
+            # The limiter must never be what takes an endpoint down
+            return
+        if wait > 0:
+            raise HTTPException(429, "rate limit exceeded", headers={"Retry-After": str(max(1, round(wait)))})
+
+    return check
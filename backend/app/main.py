@@ -1,13 +1,23 @@
 from __future__ import annotations
 
+import asyncio
+import io
+import os
+from contextlib import contextmanager
 from typing import Dict, Any
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, File, HTTPException, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import FileResponse, ORJSONResponse, StreamingResponse
+import orjson
 from pydantic import BaseModel
 
-from .engine import create_session, SESSIONS, materialise_plan, render_instance, next_instance
-from .data import list_teams, get_team
-from .mongo import ensure_indexes
+from .engine import apply_answers, render_instance, next_instance
+from .store import STORE, refresh_sessions
+from .state import DEFAULT_SURVEY_ID, INTRO_ITEM
+from .surveys import list_surveys
+from .data import ROSTER_SOURCE, list_teams, get_team, on_roster_change, warm_team_data
+from .mongo import start_index_check
 from .persist import (
     create_session_doc,
     save_intro_and_materialise,
@@ -15,10 +25,32 @@ from .persist import (
     mark_complete,
     mark_submitted,
     save_intake_form,
+    utcnow,
 )
 from .schemas import IntakeForm
-
-app = FastAPI(title="Survey MVP")
+from .reports import PROGRESS_REPORT
+from .feed import FEED, publish_status
+from .ingest import ingest_roster
+from .teams import RosterConflict
+from .journal import team_record
+from .limits import ADMISSION, rate_limit
+from .auth import require_admin
+from . import profiling
+from .profiling import profiled
+
+app = FastAPI(title="Survey MVP", default_response_class=ORJSONResponse)
+
+class StreamSafeGZipMiddleware(GZipMiddleware):
+    """GZip, except for event streams (compression would buffer events)."""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].endswith("/stream"):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+# Rendered blocks (intro team list, member evaluations) are the large responses
+app.add_middleware(StreamSafeGZipMiddleware, minimum_size=int(os.environ.get("GZIP_MIN_SIZE", "1024")))
 
 app.add_middleware(
     CORSMiddleware,
@@ -33,6 +65,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Opt-in request profiling (PROFILE_DIR); nothing is installed otherwise
+if profiling.ENABLED:
+    app.add_middleware(profiling.ProfileMiddleware)
+
 class CreateSessionResponse(BaseModel):
     session_id: str
     teams: list[str]
@@ -42,138 +78,258 @@ class SaveAnswersRequest(BaseModel):
 
 @app.on_event("startup")
 def startup():
-    ensure_indexes()
+    # Both run in background threads; index creation itself is `python -m app.migrate`
+    start_index_check()
+    # In-memory sessions follow roster changes published by other processes
+    on_roster_change(refresh_sessions)
+    # The report lists the roster's teams
+    on_roster_change(lambda changed: PROGRESS_REPORT.invalidate())
+    warm_team_data()
+    # Journal store: recover sessions and start syncing them to Mongo
+    STORE.start()
+
+@app.on_event("shutdown")
+def shutdown():
+    STORE.stop()
+
+def admit_writes():
+    """Admission control for endpoints that write Mongo on the request path."""
+    if STORE.deferred:
+        yield
+        return
+    yield from ADMISSION()
+
+def admit_reads():
+    """Admission control for endpoints that read sessions from Mongo (shared store)."""
+    if not STORE.shared:
+        yield
+        return
+    yield from ADMISSION()
+
+@contextmanager
+def persisting():
+    """
+    Mongo writes are best-effort with the in-process store (runtime keeps
+    working if mongo is down), but with a shared store they are the only
+    copy, so a failure must reach the client.
+    """
+    try:
+        yield
+    except Exception:
+        if STORE.shared:
+            raise HTTPException(503, "session store unavailable")
+
+def load_session(session_id: str):
+    try:
+        s = STORE.get(session_id)
+    except Exception:
+        raise HTTPException(503, "session store unavailable")
+    if not s:
+        raise HTTPException(404, "session not found")
+    return s
 
 @app.get("/healthz")
 def healthz():
     return {"ok": True}
 
-@app.post("/sessions", response_model=CreateSessionResponse)
-def post_sessions():
-    s = create_session()
-    # Persist minimal session doc (does not affect runtime if mongo is down)
-    try:
-        create_session_doc(s["session_id"])
-    except Exception:
-        # Do not break existing functionality; keep runtime in-memory working
-        pass
-    return {"session_id": s["session_id"], "teams": list_teams()}
+@app.get("/surveys")
+def get_surveys():
+    return {"surveys": list_surveys(), "default": DEFAULT_SURVEY_ID}
 
-@app.get("/sessions/{session_id}/instances/{instance_id}")
+@app.post(
+    "/sessions",
+    response_model=CreateSessionResponse,
+    dependencies=[Depends(rate_limit("sessions")), Depends(admit_writes)],
+)
+@profiled
+def post_sessions(survey_id: str = DEFAULT_SURVEY_ID):
+    try:
+        s = STORE.create(survey_id)
+    except KeyError:
+        raise HTTPException(404, "survey not found")
+    # Persist minimal session doc
+    if not STORE.deferred:
+        with persisting():
+            create_session_doc(s.session_id, survey_id=s.survey_id)
+    publish_status(s)
+    return {"session_id": s.session_id, "teams": list_teams()}
+
+@app.get("/sessions/{session_id}/instances/{instance_id}", dependencies=[Depends(admit_reads)])
+@profiled
 def get_instance(session_id: str, instance_id: str):
-    s = SESSIONS.get(session_id)
-    if not s:
-        raise HTTPException(404, "session not found")
+    s = load_session(session_id)
 
-    if instance_id == "intro__1":
-        return render_instance(s, {"instance_id": "intro__1", "kind": "intro", "bindings": {}})
+    if instance_id == INTRO_ITEM.instance_id:
+        return render_instance(s, INTRO_ITEM)
 
-    inst = next((i for i in s.get("plan", []) if i["instance_id"] == instance_id), None)
+    inst = s.find(instance_id)
     if not inst:
         raise HTTPException(404, "instance not found")
 
     return render_instance(s, inst)
 
-@app.post("/sessions/{session_id}/instances/{instance_id}/answers")
+@app.post(
+    "/sessions/{session_id}/instances/{instance_id}/answers",
+    dependencies=[Depends(rate_limit("answers")), Depends(admit_writes)],
+)
+@profiled
 def post_answers(session_id: str, instance_id: str, req: SaveAnswersRequest):
-    s = SESSIONS.get(session_id)
-    if not s:
-        raise HTTPException(404, "session not found")
+    s = load_session(session_id)
 
-    # Merge into in-memory answers
-    s["answers"][instance_id] = {**s["answers"].get(instance_id, {}), **req.answers}
-
-    # Resolve kind + bindings (for member_id persistence)
-    if instance_id == "intro__1":
-        kind = "intro"
-        bindings = {}
+    # Resolve plan item (kind + bindings, for member_id persistence)
+    if instance_id == INTRO_ITEM.instance_id:
+        inst = INTRO_ITEM
     else:
-        inst = next((i for i in s.get("plan", []) if i["instance_id"] == instance_id), None)
+        inst = s.find(instance_id)
         if not inst:
             raise HTTPException(404, "instance not found")
-        kind = inst["kind"]
-        bindings = inst.get("bindings", {})
 
-    # Intro: materialise plan and persist canonical session fields + plan in Mongo
-    if instance_id == "intro__1":
-        team_name = s["answers"][instance_id].get("ProjectTeam")
+    # Intro must name a known team: it materialises the plan
+    if inst is INTRO_ITEM:
+        team_name = {**s.answers.get(instance_id, {}), **req.answers}.get("ProjectTeam")
         if not team_name:
             raise HTTPException(400, "ProjectTeam is required")
-
-        materialise_plan(s, team_name)
-
-        # Build a Mongo-friendly plan list (stable, serialisable)
-        plan = []
-        for p in s.get("plan", []):
-            item = {"instance_id": p["instance_id"], "kind": p["kind"]}
-            if p["kind"] == "member_evaluation":
-                b = p.get("bindings", {})
-                if "member_id" in b:
-                    item["member_id"] = b["member_id"]
-            plan.append(item)
-
-        meta = s.get("meta", {})
-        mentor_name = meta.get("mentor_name", "")
-        members = meta.get("members", [])
-
         try:
-            save_intro_and_materialise(
+            team = get_team(team_name)
+        except KeyError:
+            raise HTTPException(400, "unknown ProjectTeam")
+
+    # Journal (if any) first, then the in-memory mutation
+    status = s.status
+    fields: Dict[str, Any] = {"instance_id": instance_id, "answers": req.answers}
+    if inst is INTRO_ITEM:
+        fields["team"] = team_record(team)
+    with STORE.mutation(s.session_id, "answers", **fields):
+        apply_answers(s, inst, req.answers)
+
+    # A deferred store syncs Mongo in the background; otherwise persist now
+    if not STORE.deferred:
+        # Intro: persist canonical session fields + plan in Mongo
+        if inst is INTRO_ITEM:
+            with persisting():
+                save_intro_and_materialise(
+                    session_id=session_id,
+                    team_name=s.team_name,
+                    mentor_name_roster=s.mentor_name,
+                    members=[m.to_dict() for m in s.members],
+                    plan=s.mongo_plan(),
+                    answers_intro=s.answers[instance_id],
+                )
+
+        # Persist current instance answers into final schema paths (+ cursor, for shared stores)
+        with persisting():
+            save_instance_answers(
                 session_id=session_id,
-                team_name=meta.get("team_name", team_name),
-                mentor_name_roster=mentor_name,
-                members=members,
-                plan=plan,
-                answers_intro=s["answers"][instance_id],
+                instance_kind=inst.kind,
+                instance_id=instance_id,
+                answers=s.answers[instance_id],
+                bindings=inst.bindings,
+                cursor=s.cursor,
+                survey_id=s.survey_id,
+                plan=s.mongo_plan() if STORE.shared else None,
             )
-        except Exception:
-            # Do not break existing flow
-            pass
-
-    # Persist current instance answers into final schema paths
-    try:
-        save_instance_answers(
-            session_id=session_id,
-            instance_kind=kind,
-            instance_id=instance_id,
-            answers=s["answers"][instance_id],
-            bindings=bindings,
-        )
-    except Exception:
-        pass
-
-    # Advance cursor if posting current step
-    if s.get("plan"):
-        current = next_instance(s)
-        if current and current["instance_id"] == instance_id:
-            s["cursor"] += 1
-    else:
-        s["cursor"] = 1
 
-    nxt = next_instance(s) if s.get("plan") else None
+    nxt = next_instance(s) if s.plan else None
     if nxt is None:
-        try:
-            mark_complete(session_id)
-        except Exception:
-            pass
+        if not STORE.deferred:
+            with persisting():
+                mark_complete(session_id)
+        if s.status != status:
+            publish_status(s)
         return {"done": True}
 
-    return {"next_instance_id": nxt["instance_id"]}
+    return {"next_instance_id": nxt.instance_id}
 
-@app.post("/sessions/{session_id}/submit")
+@app.post("/sessions/{session_id}/submit", dependencies=[Depends(rate_limit("submit")), Depends(admit_writes)])
+@profiled
 def submit(session_id: str):
-    s = SESSIONS.get(session_id)
-    if not s:
-        raise HTTPException(404, "session not found")
+    s = load_session(session_id)
+
+    with STORE.mutation(s.session_id, "submit"):
+        s.status = "SUBMITTED"
+    if not STORE.deferred:
+        with persisting():
+            mark_submitted(session_id)
+    publish_status(s, submitted_at=utcnow())
+    return {"status": "SUBMITTED"}
 
-    s["status"] = "SUBMITTED"
+
+# Reports expose mentor names and submission status: directors only (admin token)
+@app.get("/reports/progress", dependencies=[Depends(require_admin)])
+def get_progress_report():
     try:
-        mark_submitted(session_id)
+        return PROGRESS_REPORT.get()
     except Exception:
-        pass
-    return {"status": "SUBMITTED"}
+        raise HTTPException(503, "report unavailable")
 
 
-@app.post("/client-intake")
+@app.get("/reports/progress/stream", dependencies=[Depends(require_admin)])
+async def stream_progress():
+    """
+    Server-sent events: one `status` event per session status change. Needs
+    X-Admin-Token, so browsers read it with fetch() rather than EventSource.
+    """
+    async def events():
+        q = FEED.subscribe()
+        try:
+            yield b"retry: 5000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(q.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+                yield b"event: status\ndata: " + orjson.dumps(event) + b"\n\n"
+        finally:
+            FEED.unsubscribe(q)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/admin/roster", dependencies=[Depends(require_admin)])
+def post_roster(file: UploadFile = File(...), full: bool = False, dry_run: bool = False):
+    """Incremental roster ingestion from a Canvas export (see ingest.py)."""
+    # With the CSV source only this process would see the change; that is
+    # fine for process-local stores (one worker) but not for shared ones
+    if not dry_run and ROSTER_SOURCE != "mongo" and STORE.shared:
+        raise HTTPException(409, "set ROSTER_SOURCE=mongo to apply roster changes across workers")
+    # Sync endpoint (threadpool): parsing and sync_teams never block the event loop.
+    # The upload is spooled to disk by Starlette and read in chunks from there.
+    stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    try:
+        result = ingest_roster(stream, full=full, dry_run=dry_run)
+    except (UnicodeDecodeError, ValueError) as e:
+        raise HTTPException(400, f"unreadable roster export: {e}")
+    except RosterConflict as e:
+        raise HTTPException(409, str(e))
+    finally:
+        # Leave file.file open for Starlette to close
+        stream.detach()
+    if result["teams_affected"] and not dry_run:
+        PROGRESS_REPORT.invalidate()
+    return result
+
+
+@app.get("/admin/profiles", dependencies=[Depends(require_admin)])
+def get_profiles():
+    return {"enabled": profiling.ENABLED, "profiles": profiling.list_profiles()}
+
+
+@app.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+def download_profile(profile_id: str, format: str = "speedscope"):
+    """One captured profile as speedscope JSON or collapsed stacks (flamegraph.pl)."""
+    path = profiling.profile_path(profile_id, format)
+    if path is None:
+        raise HTTPException(404, "profile not found")
+    media_type = "application/json" if format == "speedscope" else "text/plain"
+    return FileResponse(path, media_type=media_type, filename=path.name)
+
+
+@app.post("/client-intake", dependencies=[Depends(rate_limit("intake")), Depends(ADMISSION)])
 def create_client_intake(payload: IntakeForm):
     intake_id = save_intake_form(payload.model_dump(mode="json"))
     return {"id": intake_id}
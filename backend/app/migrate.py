@@ -0,0 +1,34 @@
+"""
+One-shot index migration. Run once per deploy (not per worker):
+
+    python -m app.migrate            # create/repair indexes
+    python -m app.migrate --check    # report missing indexes, exit 1 if any
+
+The roster itself is synced separately with `python -m app.teams`.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+
+from .mongo import ensure_indexes, verify_indexes
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.migrate", description="Manage Mongo indexes.")
+    parser.add_argument("--check", action="store_true", help="only verify; do not create anything")
+    args = parser.parse_args(argv)
+
+    if not args.check:
+        ensure_indexes()
+
+    missing = verify_indexes()
+    for name in missing:
+        print(f"missing: {name}")
+    if not missing:
+        print("indexes ok")
+    return 1 if missing else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,55 @@
+from __future__ import annotations
+
+import logging
 import os
-from pymongo import MongoClient, ASCENDING, DESCENDING
-from pymongo.errors import ServerSelectionTimeoutError
+import threading
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from pymongo import MongoClient
+
+log = logging.getLogger(__name__)
+
+# pymongo is imported lazily (first get_mongo call) to keep worker boot fast.
+ASCENDING = 1
+DESCENDING = -1
 
 _client: MongoClient | None = None
+_client_lock = threading.Lock()
+
+# Per process: total connections are roughly WEB_CONCURRENCY x MAX_POOL_SIZE
+MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", "50"))
+
+
+class InFlight:
+    """Count of Mongo commands currently running in this process (all threads)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def incr(self, n: int) -> None:
+        with self._lock:
+            self.value += n
+
+
+IN_FLIGHT_OPS = InFlight()
+
+
+def _ops_listener():
+    from pymongo import monitoring
+
+    class OpsListener(monitoring.CommandListener):
+        def started(self, event):
+            IN_FLIGHT_OPS.incr(1)
+
+        def succeeded(self, event):
+            IN_FLIGHT_OPS.incr(-1)
+
+        def failed(self, event):
+            IN_FLIGHT_OPS.incr(-1)
+
+    return OpsListener()
 
 def get_mongo():
     """
@@ -11,75 +58,145 @@ def get_mongo():
     """
     global _client
     if _client is None:
-        # IMPORTANT:
-        # - In docker compose, backend must connect to hostname "mongodb"
-        # - On host (no docker), localhost is fine
-        url = os.environ.get("MONGO_URL", "mongodb://mongodb:27017")
-
-        _client = MongoClient(
-            url,
-            serverSelectionTimeoutMS=3000,
-            connectTimeoutMS=3000,
-            socketTimeoutMS=10000,
-            maxPoolSize=50,
-            minPoolSize=5,
-            retryWrites=True,
-        )
+        with _client_lock:
+            if _client is None:
+                from pymongo import MongoClient
+
+                # IMPORTANT:
+                # - In docker compose, backend must connect to hostname "mongodb"
+                # - On host (no docker), localhost is fine
+                url = os.environ.get("MONGO_URL", "mongodb://mongodb:27017")
+
+                _client = MongoClient(
+                    url,
+                    serverSelectionTimeoutMS=3000,
+                    connectTimeoutMS=3000,
+                    socketTimeoutMS=10000,
+                    maxPoolSize=MAX_POOL_SIZE,
+                    minPoolSize=5,
+                    retryWrites=True,
+                    event_listeners=[_ops_listener()],
+                )
 
     dbname = os.environ.get("MONGO_DB", "surveydb")
     return _client[dbname]
 
 def ping() -> bool:
+    from pymongo.errors import ServerSelectionTimeoutError
+
     try:
         get_mongo().command("ping")
         return True
     except ServerSelectionTimeoutError:
         return False
 
-def ensure_indexes():
-    db = get_mongo()
+# (collection, keys, options) for every plain index; names follow pymongo's default.
+INDEXES = [
+    # survey sessions
+    ("survey_sessions", [("session_id", ASCENDING)], {"unique": True}),
+    ("survey_sessions", [("team_key", ASCENDING), ("submitted_at", DESCENDING)], {}),
+    ("survey_sessions", [("status", ASCENDING), ("updated_at", DESCENDING)], {}),
+    # teams
+    ("teams", [("team_key", ASCENDING)], {"unique": True}),
+    ("teams", [("team_name", ASCENDING)], {}),
+    # client intake forms
+    ("client_intake_forms", [("created_at", DESCENDING)], {}),
+    ("client_intake_forms", [("company_name", ASCENDING)], {}),
+    # shared rate-limit buckets (limits.MongoBackend); idle buckets expire
+    ("rate_limits", [("ts", ASCENDING)], {"expireAfterSeconds": 3600}),
+]
 
-    # survey sessions (idempotent)
-    db.survey_sessions.create_index([("session_id", ASCENDING)], unique=True)
-    db.survey_sessions.create_index([("team_key", ASCENDING), ("submitted_at", DESCENDING)])
-    db.survey_sessions.create_index([("status", ASCENDING), ("updated_at", DESCENDING)])
+# TTL index (restart-safe). Abandoned IN_PROGRESS sessions expire this long
+# after their last write; reads do not extend it, and with the shared store
+# survey_sessions is the only copy, so this must comfortably exceed the time a
+# mentor may spend on one block (default 7 days).
+TTL_INDEX_NAME = "ttl_in_progress_sessions"
+TTL_SECONDS = int(os.environ.get("SESSION_TTL_SECONDS", str(7 * 24 * 3600)))
+TTL_FILTER = {"status": "IN_PROGRESS"}
 
-    # teams (idempotent)
-    db.teams.create_index([("team_key", ASCENDING)], unique=True)
-    db.teams.create_index([("team_name", ASCENDING)])
 
-    # client intake forms (idempotent)
-    db.client_intake_forms.create_index([("created_at", DESCENDING)])
-    db.client_intake_forms.create_index([("company_name", ASCENDING)])
+def _index_name(keys) -> str:
+    return "_".join(f"{k}_{d}" for k, d in keys)
 
-    # TTL index (restart-safe)
-    desired_ttl = 1200  # 20 minutes
-    index_name = "ttl_in_progress_sessions"
-    desired_filter = {"status": "IN_PROGRESS"}
+
+def ensure_indexes():
+    """
+    Creates (or repairs) all indexes. Run once per deploy via
+    `python -m app.migrate`, not on every worker start.
+    """
+    db = get_mongo()
+
+    # idempotent
+    for coll, keys, opts in INDEXES:
+        db[coll].create_index(keys, **opts)
 
     existing = {idx["name"]: idx for idx in db.survey_sessions.list_indexes()}
-    idx = existing.get(index_name)
+    idx = existing.get(TTL_INDEX_NAME)
 
     if idx is None:
         # Create only if it does not exist
-        db.survey_sessions.create_index(
-            [("updated_at", ASCENDING)],
-            expireAfterSeconds=desired_ttl,
-            partialFilterExpression=desired_filter,
-            name=index_name,
-        )
+        _create_ttl_index(db)
         return
 
     # OPTIONAL (recommended): if it exists but differs, do NOT crash; fix it deterministically
-    existing_ttl = idx.get("expireAfterSeconds")
-    existing_filter = idx.get("partialFilterExpression")
-
-    if existing_ttl != desired_ttl or existing_filter != desired_filter:
-        db.survey_sessions.drop_index(index_name)
-        db.survey_sessions.create_index(
-            [("updated_at", ASCENDING)],
-            expireAfterSeconds=desired_ttl,
-            partialFilterExpression=desired_filter,
-            name=index_name,
-        )
+    if idx.get("expireAfterSeconds") != TTL_SECONDS or idx.get("partialFilterExpression") != TTL_FILTER:
+        db.survey_sessions.drop_index(TTL_INDEX_NAME)
+        _create_ttl_index(db)
+
+
+def _create_ttl_index(db) -> None:
+    db.survey_sessions.create_index(
+        [("updated_at", ASCENDING)],
+        expireAfterSeconds=TTL_SECONDS,
+        partialFilterExpression=TTL_FILTER,
+        name=TTL_INDEX_NAME,
+    )
+
+
+def verify_indexes() -> list[str]:
+    """
+    Read-only check: returns "<collection>.<index>" for every expected index
+    that is missing (the TTL index is also reported if its options drifted).
+    """
+    db = get_mongo()
+    missing: list[str] = []
+    by_coll: dict[str, dict] = {}
+
+    for coll, keys, _ in INDEXES:
+        if coll not in by_coll:
+            by_coll[coll] = {idx["name"]: idx for idx in db[coll].list_indexes()}
+        name = _index_name(keys)
+        if name not in by_coll[coll]:
+            missing.append(f"{coll}.{name}")
+
+    ttl = by_coll["survey_sessions"].get(TTL_INDEX_NAME)
+    if ttl is None or ttl.get("expireAfterSeconds") != TTL_SECONDS or ttl.get("partialFilterExpression") != TTL_FILTER:
+        missing.append(f"survey_sessions.{TTL_INDEX_NAME}")
 
+    return missing
+
+
+def _check_indexes(mode: str) -> None:
+    try:
+        if mode == "ensure":
+            ensure_indexes()
+            return
+        missing = verify_indexes()
+        if missing:
+            log.warning("missing Mongo indexes (run `python -m app.migrate`): %s", ", ".join(missing))
+    except Exception:
+        log.warning("Mongo index check failed", exc_info=True)
+
+
+def start_index_check() -> None:
+    """
+    Startup hook. MONGO_INDEXES selects the behaviour:
+    - verify (default): list indexes in a background thread and log what is missing
+    - ensure: create/repair indexes in a background thread (single-node dev setups)
+    - skip: do nothing
+    Never blocks worker boot, even when Mongo is unreachable.
+    """
+    mode = os.environ.get("MONGO_INDEXES", "verify").strip().lower()
+    if mode == "skip":
+        return
+    threading.Thread(target=_check_indexes, args=(mode,), name="mongo-indexes", daemon=True).start()
@@ -4,6 +4,8 @@ from typing import Any, Dict, Optional
 import re
 
 from .mongo import get_mongo
+from .state import DEFAULT_SURVEY_ID, Session
+from .surveys import get_survey
 
 def utcnow():
     return datetime.now(timezone.utc)
@@ -14,13 +16,14 @@ def slugify(s: str) -> str:
     s = re.sub(r"_+", "_", s).strip("_")
     return s
 
-def create_session_doc(session_id: str) -> None:
+def create_session_doc(session_id: str, survey_id: str = DEFAULT_SURVEY_ID) -> None:
     db = get_mongo()
     now = utcnow()
     db.survey_sessions.update_one(
         {"session_id": session_id},
         {"$setOnInsert": {
             "session_id": session_id,
+            "survey_id": survey_id,
             "status": "IN_PROGRESS",
             "cursor": 0,
             "created_at": now,
@@ -31,6 +34,7 @@ def create_session_doc(session_id: str) -> None:
             "team_key": None,
             "team_name": None,
             "mentor_name_roster": None,
+            "members": [],
             "mentor_name_entered": None,
         }},
         upsert=True,
@@ -55,6 +59,7 @@ def save_intro_and_materialise(
             "team_key": team_key,
             "team_name": team_name,
             "mentor_name_roster": mentor_name_roster,
+            "members": members,
             "answers.intro": answers_intro,
             "plan": plan,
             "cursor": 1,
@@ -63,47 +68,31 @@ def save_intro_and_materialise(
         upsert=True,
     )
 
-def save_instance_answers(session_id: str, instance_kind: str, instance_id: str, answers: dict, bindings: Optional[dict] = None) -> None:
+def save_instance_answers(
+    session_id: str,
+    instance_kind: str,
+    instance_id: str,
+    answers: dict,
+    bindings: Optional[dict] = None,
+    cursor: Optional[int] = None,
+    survey_id: str = DEFAULT_SURVEY_ID,
+    plan: Optional[list[dict]] = None,
+) -> None:
     """
-    Writes answers into the final schema under answers.<block>.
-    - mentor_confirmation -> answers.mentor_confirmation
-    - overall_performance -> answers.overall_performance
-    - client_communication -> answers.client_communication
-    - director_comment -> answers.director_comment
-    - member_evaluation -> answers.member_evaluations.<member_id>
+    Writes answers into the final schema, at the path the survey definition
+    gives for the block kind (e.g. answers.member_evaluations.<member_id>).
+    When given, the session cursor (and the plan it indexes) is stored in the
+    same update so any worker can resume it.
     """
     db = get_mongo()
     now = utcnow()
 
     set_ops: Dict[str, Any] = {"updated_at": now}
-
-    if instance_kind == "mentor_confirmation":
-        set_ops["answers.mentor_confirmation"] = answers
-
-    elif instance_kind == "overall_performance":
-        set_ops["answers.overall_performance"] = answers
-
-    elif instance_kind == "client_communication":
-        set_ops["answers.client_communication"] = answers
-
-    elif instance_kind == "director_comment":
-        set_ops["answers.director_comment"] = answers
-
-    elif instance_kind == "member_evaluation":
-        if not bindings or "member_id" not in bindings:
-            # Do not break runtime; just store by instance_id as fallback
-            set_ops[f"answers.member_evaluations.{instance_id}"] = answers
-        else:
-            mid = bindings["member_id"]
-            set_ops[f"answers.member_evaluations.{mid}"] = answers
-
-    elif instance_kind == "intro":
-        # intro is handled by save_intro_and_materialise; keep safe fallback
-        set_ops["answers.intro"] = answers
-
-    else:
-        # Unknown block kind: store under answers.misc.<instance_id>
-        set_ops[f"answers.misc.{instance_id}"] = answers
+    set_ops[get_survey(survey_id).answer_path(instance_kind, instance_id, bindings)] = answers
+    if cursor is not None:
+        set_ops["cursor"] = cursor
+    if plan is not None:
+        set_ops["plan"] = plan
 
     db.survey_sessions.update_one(
         {"session_id": session_id},
@@ -111,6 +100,41 @@ def save_instance_answers(session_id: str, instance_kind: str, instance_id: str,
         upsert=True,
     )
 
+def save_session_snapshot(session: Session, updated_at: datetime, submitted_at: Optional[datetime] = None) -> None:
+    """
+    Idempotent full write of an in-memory session (status, cursor, team, plan
+    and every answered block at its survey path). Used by the journal replayer,
+    so replaying the same or a newer state twice is harmless.
+    """
+    db = get_mongo()
+    survey = get_survey(session.survey_id)
+
+    set_ops: Dict[str, Any] = {
+        "survey_id": session.survey_id,
+        "status": session.status,
+        "cursor": session.cursor,
+        "plan": session.mongo_plan(),
+        "updated_at": updated_at,
+    }
+    if session.team_name:
+        set_ops["team_key"] = slugify(session.team_name)
+        set_ops["team_name"] = session.team_name
+        set_ops["mentor_name_roster"] = session.mentor_name
+        set_ops["members"] = [m.to_dict() for m in session.members]
+    if submitted_at is not None:
+        set_ops["submitted_at"] = submitted_at
+
+    answers = dict(session.answers)
+    for item in session.plan:
+        if item.instance_id in answers:
+            set_ops[survey.answer_path(item.kind, item.instance_id, item.bindings)] = answers[item.instance_id]
+
+    db.survey_sessions.update_one(
+        {"session_id": session.session_id},
+        {"$set": set_ops, "$setOnInsert": {"created_at": updated_at}},
+        upsert=True,
+    )
+
 def mark_complete(session_id: str) -> None:
     db = get_mongo()
     now = utcnow()
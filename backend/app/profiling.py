@@ -0,0 +1,258 @@
+"""
+Opt-in per-request profiling of the hot survey endpoints.
+
+Disabled unless PROFILE_DIR is set; then neither the middleware nor the
+endpoint wrappers are installed, so a normal deployment pays nothing. When
+enabled, a request is profiled if
+- it carries `X-Profile: 1` together with a valid X-Admin-Token, or
+- it is picked by PROFILE_SAMPLE_RATE (0..1, default 0).
+
+Endpoints decorated with @profiled are traced in the worker thread that runs
+them (sync endpoints run in the threadpool, where a profiler enabled by the
+middleware would see nothing), which covers render_instance,
+materialise_plan and the persist.* calls they make. Each profile is written
+to PROFILE_DIR as <id>.speedscope.json (evented, https://www.speedscope.app)
+and <id>.collapsed (folded stacks weighted in microseconds, for
+flamegraph.pl / inferno); the newest PROFILE_MAX_FILES profiles are kept.
+
+    GET /admin/profiles
+    GET /admin/profiles/{profile_id}?format=speedscope|collapsed
+"""
+from __future__ import annotations
+
+import functools
+import inspect
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .auth import is_admin
+
+log = logging.getLogger(__name__)
+
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "").strip()
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", "200"))
+ENABLED = bool(PROFILE_DIR)
+
+FORMATS = {"speedscope": ".speedscope.json", "collapsed": ".collapsed"}
+PROFILE_ID = re.compile(r"^[0-9]{8}T[0-9]{6}-[a-z0-9_-]{1,80}-[0-9a-f]{8}$")
+
+# Set by the middleware for requests that should be profiled
+_requested: ContextVar[Optional[str]] = ContextVar("profile_request", default=None)
+_prune_lock = threading.Lock()
+
+
+def _frame_name(code) -> Tuple[str, str, int]:
+    name = getattr(code, "co_qualname", code.co_name)
+    return name, code.co_filename, code.co_firstlineno
+
+
+def _builtin_name(fn: Any) -> Tuple[str, str, int]:
+    module = getattr(fn, "__module__", None) or ""
+    name = getattr(fn, "__qualname__", None) or getattr(fn, "__name__", repr(fn))
+    return (f"{module}.{name}" if module else name), "<built-in>", 0
+
+
+class Tracer:
+    """
+    Deterministic call tracer for one thread (sys.setprofile). Records
+    speedscope open/close events and self time per stack.
+    """
+
+    def __init__(self):
+        self.frames: List[Tuple[str, str, int]] = []
+        self._frame_ids: Dict[Tuple[str, str, int], int] = {}
+        self.events: List[Tuple[str, int, int]] = []  # (O|C, frame, at_us)
+        self.self_us: Counter = Counter()  # stack of frame ids -> microseconds
+        self._stack: List[int] = []
+        self._t0 = 0
+        self._last = 0
+
+    def _frame_id(self, key: Tuple[str, str, int]) -> int:
+        fid = self._frame_ids.get(key)
+        if fid is None:
+            fid = self._frame_ids[key] = len(self.frames)
+            self.frames.append(key)
+        return fid
+
+    def _tick(self) -> int:
+        now = time.perf_counter_ns()
+        if self._stack:
+            self.self_us[tuple(self._stack)] += (now - self._last) / 1000
+        self._last = now
+        return (now - self._t0) // 1000
+
+    def __call__(self, frame, event: str, arg: Any) -> None:
+        if event == "call":
+            at = self._tick()
+            fid = self._frame_id(_frame_name(frame.f_code))
+        elif event == "c_call":
+            at = self._tick()
+            fid = self._frame_id(_builtin_name(arg))
+        elif self._stack:  # return / c_return / c_exception
+            at = self._tick()
+            self.events.append(("C", self._stack.pop(), at))
+            return
+        else:
+            # Returning from a frame entered before tracing started
+            return
+        self._stack.append(fid)
+        self.events.append(("O", fid, at))
+
+    def start(self) -> None:
+        self._t0 = self._last = time.perf_counter_ns()
+        sys.setprofile(self)
+
+    def stop(self) -> int:
+        sys.setprofile(None)
+        end = self._tick()
+        # Drop this very call (stop -> sys.setprofile), traced on the way in
+        while self._stack and self.frames[self._stack[-1]] in _OWN_FRAMES:
+            self.self_us.pop(tuple(self._stack), None)
+            fid = self._stack.pop()
+            if self.events and self.events[-1][:2] == ("O", fid):
+                end = self.events.pop()[2]
+        while self._stack:
+            self.events.append(("C", self._stack.pop(), end))
+        return end
+
+    # -- output ------------------------------------------------------------
+
+    def speedscope(self, name: str, end_us: int) -> Dict[str, Any]:
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "app.profiling",
+            "shared": {"frames": [{"name": n, "file": f, "line": ln} for n, f, ln in self.frames]},
+            "profiles": [{
+                "type": "evented",
+                "name": name,
+                "unit": "microseconds",
+                "startValue": 0,
+                "endValue": end_us,
+                "events": [{"type": t, "frame": fid, "at": at} for t, fid, at in self.events],
+            }],
+        }
+
+    def collapsed(self) -> str:
+        labels = [f"{n} ({Path(f).name}:{ln})".replace(";", ":") for n, f, ln in self.frames]
+        lines = [
+            f"{';'.join(labels[fid] for fid in stack)} {round(us)}"
+            for stack, us in self.self_us.items()
+            if round(us) > 0
+        ]
+        return "\n".join(sorted(lines)) + "\n"
+
+
+_OWN_FRAMES = {_frame_name(Tracer.stop.__code__), _builtin_name(sys.setprofile)}
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", text.lower()).strip("_")[:80] or "request"
+
+
+def _write(label: str, tracer: Tracer, end_us: int) -> str:
+    directory = Path(PROFILE_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    profile_id = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}-{_slug(label)}-{uuid.uuid4().hex[:8]}"
+    (directory / f"{profile_id}.speedscope.json").write_text(
+        json.dumps(tracer.speedscope(label, end_us), separators=(",", ":"))
+    )
+    (directory / f"{profile_id}.collapsed").write_text(tracer.collapsed())
+    _prune(directory)
+    return profile_id
+
+
+def _prune(directory: Path) -> None:
+    with _prune_lock:
+        profiles = sorted(directory.glob("*.speedscope.json"), key=lambda p: p.stat().st_mtime)
+        for path in profiles[: max(0, len(profiles) - PROFILE_MAX_FILES)]:
+            profile_id = path.name[: -len(FORMATS["speedscope"])]
+            for suffix in FORMATS.values():
+                (directory / f"{profile_id}{suffix}").unlink(missing_ok=True)
+
+
+def profiled(fn: Callable) -> Callable:
+    """Traces a sync endpoint when the current request was selected for profiling."""
+    if not ENABLED:
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        label = _requested.get()
+        if label is None:
+            return fn(*args, **kwargs)
+        tracer = Tracer()
+        tracer.start()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            end_us = tracer.stop()
+            try:
+                profile_id = _write(label, tracer, end_us)
+                log.info("profile %s written (%.1f ms)", profile_id, end_us / 1000)
+            except Exception:
+                log.warning("could not write profile for %s", label, exc_info=True)
+
+    # FastAPI reads parameters from the signature; resolve the endpoint's
+    # postponed annotations in its own module rather than this one
+    wrapper.__signature__ = inspect.signature(fn, eval_str=True)
+    return wrapper
+
+
+class ProfileMiddleware:
+    """Marks requests to profile; installed only when profiling is enabled."""
+
+    def __init__(self, app, sample_rate: float = PROFILE_SAMPLE_RATE):
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._selected(scope):
+            await self.app(scope, receive, send)
+            return
+        token = _requested.set(f"{scope['method']} {scope['path']}")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _requested.reset(token)
+
+    def _selected(self, scope) -> bool:
+        headers = dict(scope.get("headers") or ())
+        if headers.get(b"x-profile") in (b"1", b"true"):
+            return is_admin(headers.get(b"x-admin-token", b"").decode("latin-1"))
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    directory = Path(PROFILE_DIR)
+    if not ENABLED or not directory.is_dir():
+        return []
+    out = []
+    for path in directory.glob("*.speedscope.json"):
+        stat = path.stat()
+        out.append({
+            "id": path.name[: -len(FORMATS["speedscope"])],
+            "created_at": stat.st_mtime,
+            "bytes": stat.st_size,
+        })
+    return sorted(out, key=lambda p: p["created_at"], reverse=True)
+
+
+def profile_path(profile_id: str, fmt: str) -> Optional[Path]:
+    """File for a profile id and format, or None (ids are validated: no path traversal)."""
+    if not ENABLED or fmt not in FORMATS or not PROFILE_ID.match(profile_id):
+        return None
+    path = Path(PROFILE_DIR) / f"{profile_id}{FORMATS[fmt]}"
+    return path if path.is_file() else None
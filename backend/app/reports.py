@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Generic, List, Optional, TypeVar
+
+from .data import team_data
+from .mongo import get_mongo
+from .persist import slugify, utcnow
+
+log = logging.getLogger(__name__)
+
+STATUSES = ("IN_PROGRESS", "COMPLETE", "SUBMITTED")
+
+# Served as-is while younger than REPORT_TTL_SECONDS; served stale (and refreshed
+# in the background) up to REPORT_STALE_SECONDS; recomputed inline after that.
+REPORT_TTL_SECONDS = float(os.environ.get("REPORT_TTL_SECONDS", "15"))
+REPORT_STALE_SECONDS = float(os.environ.get("REPORT_STALE_SECONDS", "120"))
+
+T = TypeVar("T")
+
+
+class SWRCache(Generic[T]):
+    """
+    Single-value stale-while-revalidate cache. At most one load runs at a
+    time per process, however many requests arrive.
+    """
+
+    def __init__(self, loader: Callable[[], T], ttl: float, stale_ttl: float):
+        self.loader = loader
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._value: Optional[T] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._flag_lock = threading.Lock()
+        self._refreshing = False
+
+    def get(self) -> T:
+        age = time.monotonic() - self._loaded_at
+        if self._value is not None and age < self.ttl:
+            return self._value
+        if self._value is not None and age < self.stale_ttl:
+            self._refresh_in_background()
+            return self._value
+        with self._lock:
+            # Another request may have loaded it while we waited
+            if self._value is None or time.monotonic() - self._loaded_at >= self.ttl:
+                self._load()
+            return self._value
+
+    def invalidate(self) -> None:
+        """The next get() reloads inline (e.g. the roster changed)."""
+        self._loaded_at = float("-inf")
+
+    def _load(self) -> None:
+        value = self.loader()
+        self._value = value
+        self._loaded_at = time.monotonic()
+
+    def _refresh_in_background(self) -> None:
+        with self._flag_lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._background_load, name="swr-refresh", daemon=True).start()
+
+    def _background_load(self) -> None:
+        try:
+            with self._lock:
+                self._load()
+        except Exception:
+            log.warning("background report refresh failed; serving stale value", exc_info=True)
+        finally:
+            self._refreshing = False
+
+
+def _sessions_for_reporting():
+    from pymongo import ReadPreference
+
+    # Dashboards tolerate replica lag; keep the aggregation load off the primary
+    return get_mongo().survey_sessions.with_options(read_preference=ReadPreference.SECONDARY_PREFERRED)
+
+
+def status_counts(coll) -> Dict[str, Dict[str, int]]:
+    """team_key -> {status: n}. Matches on status first to use the (status, updated_at) index."""
+    pipeline = [
+        {"$match": {"status": {"$in": list(STATUSES)}, "team_key": {"$ne": None}}},
+        {"$group": {"_id": {"team_key": "$team_key", "status": "$status"}, "n": {"$sum": 1}}},
+    ]
+    counts: Dict[str, Dict[str, int]] = {}
+    for row in coll.aggregate(pipeline):
+        counts.setdefault(row["_id"]["team_key"], {})[row["_id"]["status"]] = row["n"]
+    return counts
+
+
+def submissions(coll, team_keys: List[str]) -> Dict[str, Dict[str, Any]]:
+    """team_key -> {last_submitted_at, submissions}, via the (team_key, submitted_at) index."""
+    pipeline = [
+        {"$match": {"team_key": {"$in": team_keys}, "submitted_at": {"$type": "date"}}},
+        {"$sort": {"team_key": 1, "submitted_at": -1}},
+        {"$group": {
+            "_id": "$team_key",
+            "last_submitted_at": {"$first": "$submitted_at"},
+            "submissions": {"$sum": 1},
+        }},
+    ]
+    return {row["_id"]: row for row in coll.aggregate(pipeline)}
+
+
+def build_progress_report() -> Dict[str, Any]:
+    coll = _sessions_for_reporting()
+    roster = team_data()
+    keys = {slugify(name): name for name in roster}
+
+    counts = status_counts(coll)
+    submitted = submissions(coll, sorted(keys))
+
+    teams = []
+    pending = []
+    for team_key, team_name in sorted(keys.items(), key=lambda kv: kv[1]):
+        mentor_name = roster[team_name].get("mentor_name")
+        mentor_name = mentor_name if isinstance(mentor_name, str) else ""
+        sub = submitted.get(team_key)
+        teams.append({
+            "team_key": team_key,
+            "team_name": team_name,
+            "mentor_name": mentor_name,
+            "counts": {st: counts.get(team_key, {}).get(st, 0) for st in STATUSES},
+            "submissions": sub["submissions"] if sub else 0,
+            "last_submitted_at": sub["last_submitted_at"] if sub else None,
+        })
+        if sub is None:
+            pending.append({"team_key": team_key, "team_name": team_name, "mentor_name": mentor_name})
+
+    return {
+        "generated_at": utcnow(),
+        "totals": {st: sum(c.get(st, 0) for c in counts.values()) for st in STATUSES},
+        "teams": teams,
+        "mentors_not_submitted": pending,
+    }
+
+
+PROGRESS_REPORT: SWRCache[Dict[str, Any]] = SWRCache(
+    build_progress_report, ttl=REPORT_TTL_SECONDS, stale_ttl=REPORT_STALE_SECONDS
+)
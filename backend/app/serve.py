@@ -0,0 +1,66 @@
+"""
+Production entry point (no reloader, multiple worker processes):
+
+    python -m app.serve
+
+Environment:
+- HOST / PORT          bind address (default 0.0.0.0:8000)
+- WEB_CONCURRENCY      worker processes (default 2). Each worker has its own
+                       Mongo pool of MONGO_MAX_POOL_SIZE connections, so size
+                       the two together against the server's connection limit
+- SESSION_STORE        memory | mongo | journal; defaults to mongo when
+                       WEB_CONCURRENCY > 1. memory and journal keep sessions in
+                       one process (journal also owns JOURNAL_DIR), so they
+                       refuse to start with more than one worker
+- GZIP_MIN_SIZE        responses at least this large are gzipped (default 1024)
+- LOG_LEVEL            uvicorn log level (default info)
+- FORWARDED_ALLOW_IPS  comma-separated proxy addresses/CIDRs whose
+                       X-Forwarded-For / X-Forwarded-Proto are trusted
+                       (default 127.0.0.1). Set it to the load balancer /
+                       ingress addresses, otherwise every client appears as
+                       the proxy and shares its rate-limit buckets (limits.py)
+
+uvloop and httptools are picked up automatically when installed
+(uvicorn[standard]); JSON responses use orjson (see main.py).
+Run `python -m app.migrate` once per deploy before starting workers.
+"""
+from __future__ import annotations
+
+import os
+import sys
+
+import uvicorn
+
+DEFAULT_WORKERS = 2
+
+
+def worker_count() -> int:
+    return max(1, int(os.environ.get("WEB_CONCURRENCY") or DEFAULT_WORKERS))
+
+
+def main() -> None:
+    workers = worker_count()
+    if workers > 1:
+        # Workers inherit the environment, so all of them see the shared store
+        store = os.environ.setdefault("SESSION_STORE", "mongo").strip().lower()
+        if store != "mongo":
+            sys.exit(
+                f"SESSION_STORE={store} keeps sessions in a single process; "
+                f"use SESSION_STORE=mongo or WEB_CONCURRENCY=1 (got {workers} workers)"
+            )
+
+    uvicorn.run(
+        "app.main:app",
+        host=os.environ.get("HOST", "0.0.0.0"),
+        port=int(os.environ.get("PORT", "8000")),
+        workers=workers,
+        loop="auto",
+        http="auto",
+        proxy_headers=True,
+        forwarded_allow_ips=os.environ.get("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+        log_level=os.environ.get("LOG_LEVEL", "info"),
+    )
+
+
+if __name__ == "__main__":
+    main()
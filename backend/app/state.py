@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import sys
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+# Use a URL-safe delimiter for instance ids
+DELIM = "__"
+
+# Survey definition used when a session does not ask for one (see surveys.py)
+DEFAULT_SURVEY_ID = "capstone_final"
+
+# Interned block kinds: every PlanItem shares these exact string objects
+INTRO = sys.intern("intro")
+MENTOR_CONFIRMATION = sys.intern("mentor_confirmation")
+OVERALL_PERFORMANCE = sys.intern("overall_performance")
+CLIENT_COMMUNICATION = sys.intern("client_communication")
+MEMBER_EVALUATION = sys.intern("member_evaluation")
+DIRECTOR_COMMENT = sys.intern("director_comment")
+
+
+@dataclass(frozen=True, slots=True)
+class Member:
+    """
+    Immutable roster member. One instance per roster row, shared by every
+    session (and plan item) that references it.
+    """
+    id: str
+    name: str
+    # Canvas identity, used to diff roster exports (see ingest.py)
+    user_id: Optional[str] = None
+    sections: Tuple[str, ...] = ()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"id": self.id, "name": self.name}
+
+    def to_roster_dict(self) -> Dict[str, Any]:
+        """Roster shape stored in the teams collection."""
+        d = self.to_dict()
+        if self.user_id is not None:
+            d["user_id"] = self.user_id
+        if self.sections:
+            d["sections"] = list(self.sections)
+        return d
+
+    @classmethod
+    def from_roster_dict(cls, d: Dict[str, Any]) -> "Member":
+        return cls(id=d["id"], name=d["name"], user_id=d.get("user_id"), sections=tuple(d.get("sections", ())))
+
+
+@dataclass(frozen=True, slots=True)
+class PlanItem:
+    """
+    One block of a session plan. Plans are immutable tuples of these, so a
+    team's plan is built once and shared across all its sessions.
+    """
+    instance_id: str
+    kind: str
+    member: Optional[Member] = None
+
+    @property
+    def bindings(self) -> Dict[str, Any]:
+        if self.member is None:
+            return {}
+        return {"member_id": self.member.id, "member_name": self.member.name}
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Legacy in-memory shape: {"instance_id", "kind", "bindings"}."""
+        return {"instance_id": self.instance_id, "kind": self.kind, "bindings": self.bindings}
+
+    def to_mongo(self) -> Dict[str, Any]:
+        """Stable, serialisable shape stored under survey_sessions.plan."""
+        item = {"instance_id": self.instance_id, "kind": self.kind}
+        if self.member is not None:
+            item["member_id"] = self.member.id
+        return item
+
+
+def plan_item(kind: str, suffix: str = "1", member: Optional[Member] = None) -> PlanItem:
+    kind = sys.intern(kind)
+    return PlanItem(instance_id=f"{kind}{DELIM}{suffix}", kind=kind, member=member)
+
+
+INTRO_ITEM = plan_item(INTRO)
+INITIAL_PLAN: Tuple[PlanItem, ...] = (INTRO_ITEM,)
+
+
+@dataclass(slots=True)
+class Session:
+    """
+    Compact in-memory survey session. Roster data (mentor, members, plan) is
+    held by reference; only answers, status and cursor are per-session.
+    """
+    session_id: str
+    survey_id: str = DEFAULT_SURVEY_ID
+    status: str = "IN_PROGRESS"
+    answers: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    team_name: Optional[str] = None
+    mentor_name: str = ""
+    members: Tuple[Member, ...] = ()
+    plan: Tuple[PlanItem, ...] = INITIAL_PLAN
+    cursor: int = 0
+
+    def find(self, instance_id: str) -> Optional[PlanItem]:
+        for item in self.plan:
+            if item.instance_id == instance_id:
+                return item
+        return None
+
+    def mongo_plan(self) -> List[Dict[str, Any]]:
+        return [item.to_mongo() for item in self.plan]
+
+    def meta(self) -> Dict[str, Any]:
+        if self.team_name is None:
+            return {}
+        return {
+            "team_name": self.team_name,
+            "mentor_name": self.mentor_name,
+            "members": [m.to_dict() for m in self.members],
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Legacy dict shape, e.g. for JSON dumps and debugging."""
+        return {
+            "session_id": self.session_id,
+            "survey_id": self.survey_id,
+            "status": self.status,
+            "answers": self.answers,
+            "meta": self.meta(),
+            "plan": [item.to_dict() for item in self.plan],
+            "cursor": self.cursor,
+        }
@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import os
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Set
+
+from .engine import SESSIONS, create_session, materialise_plan, refresh_session_plan, restore_plan, resume_cursor
+from .mongo import get_mongo
+from .state import DEFAULT_SURVEY_ID, Member, Session
+from .surveys import get_survey
+
+
+class MemoryStore:
+    """
+    Default store: sessions live in engine.SESSIONS of this process only.
+    Mongo writes are a best-effort copy.
+    """
+    shared = False
+    # True when Mongo is synced in the background rather than per request
+    deferred = False
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+    @contextmanager
+    def mutation(self, session_id: str, op: str, **fields: Any) -> Iterator[None]:
+        """Wraps each in-memory mutation of a session; only the journal store records it."""
+        yield
+
+    def create(self, survey_id: str = DEFAULT_SURVEY_ID) -> Session:
+        return create_session(survey_id)
+
+    def get(self, session_id: str) -> Optional[Session]:
+        return SESSIONS.get(session_id)
+
+
+class JournalStore(MemoryStore):
+    """
+    In-process sessions made durable by a local journal (see journal.py);
+    Mongo is brought up to date by a background replayer.
+    """
+    deferred = True
+
+    def __init__(self, journal=None):
+        from .journal import Journal, JournalReplayer
+
+        self.journal = journal or Journal()
+        self.replayer = JournalReplayer(self.journal)
+
+    def start(self) -> None:
+        from .journal import rebuild_sessions
+
+        records = self.journal.open()
+        rebuild_sessions(records, checkpoint=self.journal.checkpoint, load=_load_from_mongo)
+        self.replayer.start()
+
+    def stop(self) -> None:
+        self.replayer.stop()
+        self.journal.close()
+
+    @contextmanager
+    def mutation(self, session_id: str, op: str, **fields: Any) -> Iterator[None]:
+        # Durable before the mutation; replayable once it has been applied
+        seq = self.journal.append(op, session_id, **fields)
+        try:
+            with self.journal.apply_lock:
+                yield
+        finally:
+            self.journal.applied(seq)
+
+    def get(self, session_id: str) -> Optional[Session]:
+        s = SESSIONS.get(session_id)
+        if s is not None:
+            return s
+        # Pruned from the journal before a restart: survey_sessions has it
+        s = _load_from_mongo(session_id)
+        if s is None:
+            return None
+        return SESSIONS.setdefault(session_id, s)
+
+    def create(self, survey_id: str = DEFAULT_SURVEY_ID) -> Session:
+        get_survey(survey_id)  # KeyError for unknown surveys
+        session_id = str(uuid.uuid4())
+        with self.mutation(session_id, "create", survey_id=survey_id):
+            return create_session(survey_id, session_id=session_id)
+
+
+class MongoStore:
+    """
+    Shared store for multi-worker / multi-node serving: survey_sessions is the
+    source of truth and every request rebuilds its Session from it, so any
+    worker can serve any step. Mongo writes must succeed, and the plan is
+    written with every cursor so the stored cursor always indexes it.
+    """
+    shared = True
+    deferred = False
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+    @contextmanager
+    def mutation(self, session_id: str, op: str, **fields: Any) -> Iterator[None]:
+        yield
+
+    def create(self, survey_id: str = DEFAULT_SURVEY_ID) -> Session:
+        get_survey(survey_id)  # KeyError for unknown surveys
+        # Persisted by persist.create_session_doc; nothing is kept in-process
+        return Session(session_id=str(uuid.uuid4()), survey_id=survey_id)
+
+    def get(self, session_id: str) -> Optional[Session]:
+        return _load_from_mongo(session_id)
+
+
+def _load_from_mongo(session_id: str) -> Optional[Session]:
+    doc = get_mongo().survey_sessions.find_one({"session_id": session_id}, {"_id": 0})
+    return session_from_doc(doc) if doc is not None else None
+
+
+def _lookup(doc: Dict[str, Any], path: str) -> Optional[Dict[str, Any]]:
+    node: Any = doc
+    for part in path.split("."):
+        if not isinstance(node, dict) or part not in node:
+            return None
+        node = node[part]
+    return node
+
+
+def session_from_doc(doc: Dict[str, Any]) -> Session:
+    """
+    Rebuilds an in-memory Session from its survey_sessions document. If the
+    roster changed since the plan was stored, the cursor is carried over to
+    the current plan the same way engine.refresh_session_plan does; a team no
+    longer on the roster keeps the plan it was stored with.
+    """
+    s = Session(
+        session_id=doc["session_id"],
+        survey_id=doc.get("survey_id") or DEFAULT_SURVEY_ID,
+        status=doc.get("status") or "IN_PROGRESS",
+    )
+    survey = get_survey(s.survey_id)
+
+    team_name = doc.get("team_name")
+    if team_name:
+        try:
+            materialise_plan(s, team_name)
+        except KeyError:
+            restore_plan(
+                s,
+                team_name,
+                doc.get("mentor_name_roster") or "",
+                tuple(Member.from_roster_dict(m) for m in doc.get("members") or ()),
+                doc.get("plan") or (),
+            )
+
+    for item in s.plan:
+        answers = _lookup(doc, survey.answer_path(item.kind, item.instance_id, item.bindings))
+        if answers is not None:
+            s.answers[item.instance_id] = answers
+
+    cursor = int(doc.get("cursor") or 0)
+    stored = [item["instance_id"] for item in doc.get("plan") or ()]
+    if team_name and stored and stored != [item.instance_id for item in s.plan]:
+        cursor = resume_cursor(s.plan, stored[:cursor])
+    s.cursor = cursor
+    return s
+
+
+def refresh_sessions(teams: Set[str]) -> int:
+    """
+    Re-plans this process's in-progress sessions of `teams` after a roster
+    change (journaled, so recovery replays it in order). Shared-store
+    sessions are not held in-process; session_from_doc reconciles them.
+    """
+    n = 0
+    for s in list(SESSIONS.values()):
+        if s.status != "IN_PROGRESS" or s.team_name not in teams:
+            continue
+        with STORE.mutation(s.session_id, "refresh"):
+            refresh_session_plan(s)
+        n += 1
+    return n
+
+
+def _make_store():
+    kind = os.environ.get("SESSION_STORE", "memory").strip().lower()
+    if kind == "mongo":
+        return MongoStore()
+    if kind == "memory":
+        return MemoryStore()
+    if kind == "journal":
+        return JournalStore()
+    raise ValueError(f"Unknown SESSION_STORE: {kind}")
+
+
+STORE = _make_store()
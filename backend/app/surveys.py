@@ -0,0 +1,224 @@
+"""
+Declarative survey definitions (app/data/surveys/<survey_id>.json, or .yaml
+when PyYAML is installed), compiled once per definition version into:
+
+- plan(members)        -> tuple of PlanItems for a team
+- renderers[kind]      -> callable(session, item) returning a template block
+- answer_path(kind...) -> Mongo path the block's answers are stored under
+
+Each block names a `kind` plus either a `template` from templates.py or an
+inline `title` / `elements` (strings may use {team_name}, {mentor_name},
+{member_name}). `repeat: "members"` emits one block per roster member, and
+`store` is the answers path ({member_id} / {instance_id} are substituted).
+The first block must be the intro (it selects the team).
+
+A compiled survey is served from memory; its definition file is checked for
+changes at most every SURVEY_CHECK_SECONDS (default 30, 0 = never after the
+first load), so requests do no file I/O.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from . import templates
+from .data import list_teams
+from .state import DEFAULT_SURVEY_ID, INTRO, INTRO_ITEM, Member, PlanItem, plan_item
+
+SURVEYS_DIR = Path(__file__).parent / "data/surveys"
+SURVEY_CHECK_SECONDS = float(os.environ.get("SURVEY_CHECK_SECONDS", "30"))
+
+Renderer = Callable[[Any, PlanItem], Dict[str, Any]]
+
+# template name -> renderer(session, item); the blocks in templates.py
+TEMPLATES: Dict[str, Renderer] = {
+    "intro": lambda s, i: templates.intro_block(list_teams()),
+    "mentor_confirmation": lambda s, i: templates.mentor_confirmation_block(s.team_name or "", s.mentor_name),
+    "overall_performance": lambda s, i: templates.overall_performance_block(s.team_name or ""),
+    "client_communication": lambda s, i: templates.client_communication_block(s.team_name or ""),
+    "member_evaluation": lambda s, i: templates.member_evaluation_block(i.member.name),
+    "director_comment": lambda s, i: templates.director_comment_block(s.team_name or ""),
+}
+
+REPEATS = (None, "members")
+
+
+class _Blank(dict):
+    def __missing__(self, key: str) -> str:
+        return ""
+
+
+def _fill(node: Any, ctx: Dict[str, str]) -> Any:
+    if isinstance(node, str):
+        return node.format_map(ctx) if "{" in node else node
+    if isinstance(node, list):
+        return [_fill(n, ctx) for n in node]
+    if isinstance(node, dict):
+        return {k: _fill(v, ctx) for k, v in node.items()}
+    return node
+
+
+def _inline_renderer(kind: str, title: str, elements: List[Dict[str, Any]]) -> Renderer:
+    def render(session, item: PlanItem) -> Dict[str, Any]:
+        ctx = _Blank(
+            team_name=session.team_name or "",
+            mentor_name=session.mentor_name,
+            member_name=item.member.name if item.member else "",
+        )
+        return {"block_id": kind, "title": _fill(title, ctx), "elements": _fill(elements, ctx)}
+
+    return render
+
+
+@dataclass(frozen=True)
+class CompiledSurvey:
+    survey_id: str
+    version: str
+    title: str
+    blocks: Tuple[Tuple[str, Optional[str]], ...]  # (kind, repeat)
+    renderers: Dict[str, Renderer]
+    storage: Dict[str, str]
+
+    def plan(self, members: Tuple[Member, ...]) -> Tuple[PlanItem, ...]:
+        plan: List[PlanItem] = []
+        for kind, repeat in self.blocks:
+            if kind == INTRO:
+                plan.append(INTRO_ITEM)
+            elif repeat == "members":
+                for m in members:
+                    if not m.id or not m.name:
+                        # Skip malformed roster entries rather than crashing the whole session
+                        continue
+                    plan.append(plan_item(kind, suffix=m.id, member=m))
+            else:
+                plan.append(plan_item(kind))
+        return tuple(plan)
+
+    def render(self, session, item: PlanItem) -> Dict[str, Any]:
+        renderer = self.renderers.get(item.kind)
+        if renderer is None:
+            raise ValueError(f"Unknown instance kind: {item.kind}")
+        return renderer(session, item)
+
+    def answer_path(self, kind: str, instance_id: str, bindings: Optional[dict] = None) -> str:
+        path = self.storage.get(kind)
+        if path is None:
+            # Unknown block kind: store under answers.misc.<instance_id>
+            return f"answers.misc.{instance_id}"
+        if "{member_id}" in path:
+            # Do not break runtime; just store by instance_id as fallback
+            member_id = (bindings or {}).get("member_id") or instance_id
+            path = path.replace("{member_id}", member_id)
+        return path.replace("{instance_id}", instance_id)
+
+
+def compile_survey(raw: Dict[str, Any], version: str) -> CompiledSurvey:
+    survey_id = raw.get("survey_id")
+    blocks = raw.get("blocks") or []
+    if not survey_id or not blocks:
+        raise ValueError("survey definition needs survey_id and blocks")
+    if blocks[0].get("kind") != INTRO:
+        raise ValueError(f"{survey_id}: first block must be '{INTRO}'")
+
+    order: List[Tuple[str, Optional[str]]] = []
+    renderers: Dict[str, Renderer] = {}
+    storage: Dict[str, str] = {}
+
+    for b in blocks:
+        kind = b.get("kind")
+        repeat = b.get("repeat")
+        if not kind:
+            raise ValueError(f"{survey_id}: block without kind")
+        if kind in renderers:
+            raise ValueError(f"{survey_id}: duplicate block kind '{kind}'")
+        if repeat not in REPEATS:
+            raise ValueError(f"{survey_id}: {kind}: unsupported repeat '{repeat}'")
+
+        if "template" in b:
+            if b["template"] not in TEMPLATES:
+                raise ValueError(f"{survey_id}: {kind}: unknown template '{b['template']}'")
+            renderers[kind] = TEMPLATES[b["template"]]
+        elif "title" in b and "elements" in b:
+            renderers[kind] = _inline_renderer(kind, b["title"], b["elements"])
+        else:
+            raise ValueError(f"{survey_id}: {kind}: needs a template or title + elements")
+
+        storage[kind] = b.get("store") or (
+            f"answers.{kind}.{{member_id}}" if repeat == "members" else f"answers.{kind}"
+        )
+        order.append((kind, repeat))
+
+    return CompiledSurvey(
+        survey_id=survey_id,
+        version=version,
+        title=raw.get("title", survey_id),
+        blocks=tuple(order),
+        renderers=renderers,
+        storage=storage,
+    )
+
+
+def _parse(path: Path, text: str) -> Dict[str, Any]:
+    if path.suffix in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError:
+            raise RuntimeError(f"{path.name}: PyYAML is required for YAML survey definitions")
+        return yaml.safe_load(text)
+    return json.loads(text)
+
+
+def _definition_path(survey_id: str) -> Path:
+    if not re.fullmatch(r"[a-z0-9_\-]+", survey_id):
+        raise KeyError(f"Unknown survey: {survey_id}")
+    for suffix in (".json", ".yaml", ".yml"):
+        path = SURVEYS_DIR / f"{survey_id}{suffix}"
+        if path.is_file():
+            return path
+    raise KeyError(f"Unknown survey: {survey_id}")
+
+
+@lru_cache(maxsize=64)
+def _compiled(path: Path, digest: str) -> CompiledSurvey:
+    raw = _parse(path, path.read_text(encoding="utf-8"))
+    if raw.get("survey_id") != path.stem:
+        raise ValueError(f"{path.name}: survey_id must match the file name")
+    return compile_survey(raw, version=f"{raw.get('version', 0)}-{digest}")
+
+
+@lru_cache(maxsize=64)
+def _digest(path: Path, mtime_ns: int) -> str:
+    return hashlib.sha1(path.read_bytes()).hexdigest()[:12]
+
+
+# survey_id -> (compiled survey, monotonic time its file was last checked)
+_loaded: Dict[str, Tuple[CompiledSurvey, float]] = {}
+
+
+def get_survey(survey_id: str = DEFAULT_SURVEY_ID) -> CompiledSurvey:
+    """Compiled survey; recompiled only when the definition file's content changes."""
+    entry = _loaded.get(survey_id)
+    now = time.monotonic()
+    if entry is not None and (SURVEY_CHECK_SECONDS <= 0 or now - entry[1] < SURVEY_CHECK_SECONDS):
+        return entry[0]
+    try:
+        path = _definition_path(survey_id)
+        digest = _digest(path, path.stat().st_mtime_ns)
+    except (KeyError, FileNotFoundError):
+        # Never existed, or deleted since it was loaded
+        _loaded.pop(survey_id, None)
+        raise KeyError(f"Unknown survey: {survey_id}") from None
+    survey = _compiled(path, digest)
+    _loaded[survey_id] = (survey, now)
+    return survey
+
+
+def list_surveys() -> List[str]:
+    return sorted({p.stem for p in SURVEYS_DIR.iterdir() if p.suffix in (".json", ".yaml", ".yml")})
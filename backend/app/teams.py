@@ -0,0 +1,160 @@
+"""
+Roster/team source of truth in Mongo.
+
+`python -m app.teams` upserts the CSV roster (data.load_team_data) into the
+`teams` collection, keyed by team_key = persist.slugify(team_name) so
+survey_sessions.team_key joins against it, and bumps the roster version in
+`app_meta`. Workers with ROSTER_SOURCE=mongo serve a cached roster that a
+background watcher (data.warm_team_data) reloads when that version changes.
+
+Writers (this CLI, roster ingestion) hold a lease in `app_meta` while they
+write (roster_lock, expires after ROSTER_LOCK_SECONDS, default 300, if the
+holder dies), and sync_teams publishes only over the version they read.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sys
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from .mongo import get_mongo
+from .persist import slugify, utcnow
+from .state import Member
+
+ROSTER_META_ID = "roster"
+ROSTER_LOCK_ID = "roster_lock"
+ROSTER_LOCK_SECONDS = float(os.environ.get("ROSTER_LOCK_SECONDS", "300"))
+
+
+class RosterConflict(RuntimeError):
+    """Another writer holds the roster lease or published a newer version."""
+
+
+@contextmanager
+def roster_lock() -> Iterator[None]:
+    """Lease on the roster for one writer, across processes; RosterConflict if taken."""
+    from pymongo.errors import DuplicateKeyError
+
+    db = get_mongo()
+    owner = uuid.uuid4().hex
+    now = utcnow()
+    try:
+        # Takes a missing or expired lease; a live one makes the upsert collide
+        db.app_meta.update_one(
+            {"_id": ROSTER_LOCK_ID, "expires_at": {"$lt": now}},
+            {"$set": {"owner": owner, "expires_at": now + timedelta(seconds=ROSTER_LOCK_SECONDS)}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        raise RosterConflict("another roster update is in progress") from None
+    try:
+        yield
+    finally:
+        db.app_meta.delete_one({"_id": ROSTER_LOCK_ID, "owner": owner})
+
+
+def team_docs(teams: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    docs = []
+    for team_name in sorted(teams):
+        team = teams[team_name]
+        mentor_name = team.get("mentor_name")
+        docs.append({
+            "team_key": slugify(team_name),
+            "team_name": team_name,
+            # pandas leaves NaN for teams without a mentor row
+            "mentor_name": mentor_name if isinstance(mentor_name, str) else "",
+            "members": [m.to_roster_dict() for m in team.get("members", ())],
+        })
+    return docs
+
+
+def roster_hash(docs: List[Dict[str, Any]]) -> str:
+    raw = json.dumps(docs, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def sync_teams(
+    teams: Dict[str, Dict[str, Any]],
+    base_version: Optional[str],
+    only: Optional[Set[str]] = None,
+) -> str:
+    """
+    Upserts every team (or just the team names in `only`), removes teams no
+    longer in the roster and publishes the new roster version, provided the
+    published one is still `base_version` (the version `teams` was derived
+    from; RosterConflict otherwise). Call under roster_lock(). Idempotent: an
+    unchanged roster keeps its version.
+    """
+    from pymongo import UpdateOne
+    from pymongo.errors import DuplicateKeyError
+
+    db = get_mongo()
+    now = utcnow()
+    docs = team_docs(teams)
+    version = roster_hash(docs)
+    if roster_version() != base_version:
+        raise RosterConflict(f"roster changed since version {base_version}")
+
+    ops = [
+        UpdateOne(
+            {"team_key": d["team_key"]},
+            {"$set": {**d, "version": version, "synced_at": now}},
+            upsert=True,
+        )
+        for d in docs
+        if only is None or d["team_name"] in only
+    ]
+    if ops:
+        db.teams.bulk_write(ops, ordered=False)
+    db.teams.delete_many({"team_key": {"$nin": [d["team_key"] for d in docs]}})
+
+    # Published last, so readers never see a version whose teams are not written yet
+    try:
+        published = db.app_meta.update_one(
+            {"_id": ROSTER_META_ID, "version": base_version},
+            {"$set": {"version": version, "synced_at": now}},
+            upsert=base_version is None,
+        )
+    except DuplicateKeyError:
+        published = None
+    if published is None or (published.matched_count == 0 and published.upserted_id is None):
+        raise RosterConflict(f"roster changed since version {base_version}")
+    return version
+
+
+def roster_version() -> Optional[str]:
+    doc = get_mongo().app_meta.find_one({"_id": ROSTER_META_ID}, {"version": 1})
+    return doc.get("version") if doc else None
+
+
+def load_teams() -> Dict[str, Dict[str, Any]]:
+    """Same shape as data.load_team_data(), read from the teams collection."""
+    teams: Dict[str, Dict[str, Any]] = {}
+    for doc in get_mongo().teams.find({}, {"_id": 0, "team_name": 1, "mentor_name": 1, "members": 1}):
+        teams[doc["team_name"]] = {
+            "mentor_name": doc.get("mentor_name", ""),
+            "members": tuple(Member.from_roster_dict(m) for m in doc.get("members", [])),
+        }
+    return teams
+
+
+def main() -> int:
+    from .data import load_team_data
+
+    try:
+        with roster_lock():
+            version = sync_teams(load_team_data(), roster_version())
+    except RosterConflict as e:
+        print(f"not synced: {e}")
+        return 1
+    print(f"roster version {version}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Throughput benchmark: requests/second of `python -m app.serve` by worker count.
+
+Run from backend/ (needs the requirements installed, and a reachable Mongo:
+more than one worker runs only with the shared store, and the memory store
+persists sessions there too; SESSION_STORE=journal with one worker does not):
+    python -m bench.serve_throughput [--workers 1 2 4] [--path PATH]
+
+For each worker count the server is started on --port and a session is
+created with its intro answered; --path (by default a rendered survey block of
+that session, so every request loads it from the session store) may use
+{session_id}. --clients keep-alive client processes then hit it for
+--seconds; responses other than 200 are counted as errors, not throughput.
+The clients share the machine with the server, so scaling only shows while
+workers + clients have cores to run on; the CPU count is printed with the
+results.
+"""
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import multiprocessing as mp
+import os
+import subprocess
+import sys
+import time
+from typing import Optional, Tuple
+
+
+def _wait_ready(port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/healthz")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"server on :{port} did not become ready")
+
+
+def _call(port: int, method: str, path: str, body: Optional[dict] = None) -> dict:
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    payload = json.dumps(body).encode() if body is not None else None
+    conn.request(method, path, body=payload, headers={"Content-Type": "application/json"})
+    resp = conn.getresponse()
+    data = resp.read()
+    if resp.status != 200:
+        raise RuntimeError(f"{method} {path}: {resp.status} {data[:200]!r}")
+    return json.loads(data)
+
+
+def _session(port: int) -> str:
+    """A session past its intro, so its survey blocks can be rendered."""
+    created = _call(port, "POST", "/sessions")
+    session_id = created["session_id"]
+    intro = {"answers": {"ProjectTeam": created["teams"][0]}}
+    _call(port, "POST", f"/sessions/{session_id}/instances/intro__1/answers", intro)
+    return session_id
+
+
+def _client(port: int, path: str, seconds: float, out: "mp.Queue[Tuple[int, int]]") -> None:
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    done = errors = 0
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        conn.request("GET", path, headers={"Accept-Encoding": "gzip"})
+        resp = conn.getresponse()
+        resp.read()
+        if resp.status == 200:
+            done += 1
+        else:
+            errors += 1
+    out.put((done, errors))
+
+
+def run(workers: int, port: int, path: str, clients: int, seconds: float) -> Tuple[float, int]:
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), PORT=str(port), LOG_LEVEL="warning")
+    server = subprocess.Popen([sys.executable, "-m", "app.serve"], env=env)
+    try:
+        _wait_ready(port)
+        path = path.format(session_id=_session(port))
+        _call(port, "GET", path)
+        out: "mp.Queue[Tuple[int, int]]" = mp.Queue()
+        procs = [mp.Process(target=_client, args=(port, path, seconds, out)) for _ in range(clients)]
+        for p in procs:
+            p.start()
+        results = [out.get() for _ in procs]
+        for p in procs:
+            p.join()
+        return sum(d for d, _ in results) / seconds, sum(e for _, e in results)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--path", default="/sessions/{session_id}/instances/mentor_confirmation__1")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    base = None
+    print(f"path {args.path}, {args.clients} clients, {os.cpu_count()} CPUs")
+    print(f"{'workers':>8} {'req/s':>10} {'speedup':>8} {'errors':>7}")
+    for w in args.workers:
+        rps, errors = run(w, args.port, args.path, args.clients, args.seconds)
+        base = base or rps
+        print(f"{w:>8} {rps:>10.0f} {rps / base:>7.2f}x {errors:>7}")
+
+
+if __name__ == "__main__":
+    main()
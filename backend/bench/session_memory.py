@@ -0,0 +1,155 @@
+"""
+Memory benchmark: bytes per in-memory session, legacy dicts vs app.state.
+
+Run from backend/:
+    python -m bench.session_memory [--sessions 10000]
+
+Sessions are materialised against a synthetic roster (8 teams x 8 members)
+and given a few answers each, mirroring a mentor part-way through a survey.
+Only app.state is imported, so pandas/pymongo are not required.
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import tracemalloc
+import uuid
+from typing import Any, Callable, Dict, List, Tuple
+
+from app.state import (
+    CLIENT_COMMUNICATION,
+    DIRECTOR_COMMENT,
+    INTRO,
+    MEMBER_EVALUATION,
+    MENTOR_CONFIRMATION,
+    OVERALL_PERFORMANCE,
+    Member,
+    PlanItem,
+    Session,
+    plan_item,
+)
+
+TEAMS = 8
+MEMBERS_PER_TEAM = 8
+
+
+def _roster() -> Dict[str, Dict[str, Any]]:
+    teams = {}
+    for t in range(TEAMS):
+        members = tuple(
+            Member(id=f"student_{t}_{i}", name=f"Student{i}, Team{t}")
+            for i in range(MEMBERS_PER_TEAM)
+        )
+        teams[f"Team {chr(65 + t)}"] = {"mentor_name": f"Dr. Mentor {t}", "members": members}
+    return teams
+
+
+def _answers(session_id: str) -> Dict[str, Dict[str, Any]]:
+    return {
+        "intro__1": {"ProjectTeam": "Team A"},
+        "mentor_confirmation__1": {"MentorNameOverride": ""},
+        "overall_performance__1": {"OverallSatisfaction": 8, "ClientMeetings": 4, "HoursPerWeek": 2},
+    }
+
+
+def legacy_roster(roster: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """The pre-state.py roster: one list of member dicts per team."""
+    return {
+        name: {"mentor_name": team["mentor_name"], "members": [{"id": m.id, "name": m.name} for m in team["members"]]}
+        for name, team in roster.items()
+    }
+
+
+def legacy_session(team_name: str, team: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Replicates the pre-state.py dict layout built by engine.materialise_plan,
+    which stored the team's member list by reference and built a fresh plan.
+    """
+    session_id = str(uuid.uuid4())
+    members = team["members"]
+    plan = [
+        {"instance_id": "intro__1", "kind": "intro", "bindings": {}},
+        {"instance_id": "mentor_confirmation__1", "kind": "mentor_confirmation", "bindings": {}},
+        {"instance_id": "overall_performance__1", "kind": "overall_performance", "bindings": {}},
+        {"instance_id": "client_communication__1", "kind": "client_communication", "bindings": {}},
+    ]
+    for m in members:
+        plan.append({
+            "instance_id": f"member_evaluation__{m['id']}",
+            "kind": "member_evaluation",
+            "bindings": {"member_id": m["id"], "member_name": m["name"]},
+        })
+    plan.append({"instance_id": "director_comment__1", "kind": "director_comment", "bindings": {}})
+    return {
+        "session_id": session_id,
+        "status": "IN_PROGRESS",
+        "answers": _answers(session_id),
+        "meta": {"team_name": team_name, "mentor_name": team["mentor_name"], "members": members},
+        "plan": plan,
+        "cursor": 3,
+    }
+
+
+def _compact_plan(team: Dict[str, Any]) -> Tuple[PlanItem, ...]:
+    plan = [
+        plan_item(INTRO),
+        plan_item(MENTOR_CONFIRMATION),
+        plan_item(OVERALL_PERFORMANCE),
+        plan_item(CLIENT_COMMUNICATION),
+    ]
+    plan += [plan_item(MEMBER_EVALUATION, suffix=m.id, member=m) for m in team["members"]]
+    plan.append(plan_item(DIRECTOR_COMMENT))
+    return tuple(plan)
+
+
+def measure(n: int, build: Callable[[int], Any]) -> int:
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    held: List[Any] = [build(i) for i in range(n)]
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del held
+    return after - before
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", type=int, default=10_000)
+    args = parser.parse_args()
+
+    roster = _roster()
+    legacy_teams = legacy_roster(roster)
+    names = sorted(roster)
+    # Team plans are cached per team in engine.team_plan; build them up front.
+    plans = {name: _compact_plan(roster[name]) for name in names}
+
+    def build_legacy(i: int) -> Dict[str, Any]:
+        name = names[i % len(names)]
+        return legacy_session(name, legacy_teams[name])
+
+    def build_compact(i: int) -> Session:
+        name = names[i % len(names)]
+        session_id = str(uuid.uuid4())
+        return Session(
+            session_id=session_id,
+            answers=_answers(session_id),
+            team_name=name,
+            mentor_name=roster[name]["mentor_name"],
+            members=roster[name]["members"],
+            plan=plans[name],
+            cursor=3,
+        )
+
+    n = args.sessions
+    legacy = measure(n, build_legacy)
+    compact = measure(n, build_compact)
+
+    print(f"sessions:        {n}")
+    print(f"legacy dicts:    {legacy / n:10.0f} B/session  ({legacy / 2**20:.1f} MiB)")
+    print(f"state.Session:   {compact / n:10.0f} B/session  ({compact / 2**20:.1f} MiB)")
+    print(f"reduction:       {100 * (1 - compact / legacy):9.1f} %")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import mongomock
+import pytest
+
+from app import mongo
+from app.engine import SESSIONS
+
+
+@pytest.fixture(autouse=True)
+def clean_sessions():
+    SESSIONS.clear()
+    yield
+    SESSIONS.clear()
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """In-memory Mongo behind app.mongo.get_mongo()."""
+    # pymongo >= 4.11 passes `sort` to bulk updates, which mongomock 4.3 does not know
+    add_update = mongomock.collection.BulkOperationBuilder.add_update
+
+    def _add_update(self, *args, sort=None, **kwargs):
+        return add_update(self, *args, **kwargs)
+
+    monkeypatch.setattr(mongomock.collection.BulkOperationBuilder, "add_update", _add_update)
+    client = mongomock.MongoClient()
+    monkeypatch.setattr(mongo, "_client", client)
+    return mongo.get_mongo()
+
+
+@pytest.fixture
+def roster(monkeypatch):
+    """The cached roster (CSV data), restored after the test; returns data module."""
+    from app import data
+
+    data.team_data()
+    monkeypatch.setattr(data, "_roster", dict(data._roster))
+    monkeypatch.setattr(data, "_listeners", [])
+    return data
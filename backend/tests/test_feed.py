@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import timedelta
+
+import orjson
+
+from app import feed, main
+from app.feed import MemorySource, PollingSource, ProgressFeed, StatusTransitions
+from app.persist import utcnow
+
+
+def _doc(sid, status, created_delta=-3600):
+    now = utcnow()
+    return {"session_id": sid, "status": status, "created_at": now + timedelta(seconds=created_delta), "updated_at": now}
+
+
+def test_transitions_report_status_changes_only():
+    t = StatusTransitions()
+    assert t.changed(_doc("new", "IN_PROGRESS", created_delta=5))
+    assert not t.changed(_doc("new", "IN_PROGRESS"))  # an answer save
+    assert t.changed(_doc("new", "COMPLETE"))
+    # Older session first seen mid-survey: not a transition; leaving IN_PROGRESS is
+    assert not t.changed(_doc("old", "IN_PROGRESS"))
+    assert t.changed(_doc("older", "SUBMITTED"))
+
+
+def test_polling_source_skips_answer_saves(db):
+    source = PollingSource(interval=0)
+    # mongomock stores naive, millisecond-truncated UTC and cannot compare it with an aware bound
+    source._since = source._since.replace(tzinfo=None) - timedelta(seconds=1)
+    coll = db.survey_sessions
+    coll.insert_one(_doc("a", "IN_PROGRESS", created_delta=5))
+    ticks = iter([True, False])
+
+    events = list(source.events(lambda: next(ticks)))
+    assert [e["session_id"] for e in events] == ["a"]
+
+    # Answer save (status unchanged), then completion
+    coll.update_one({"session_id": "a"}, {"$set": {"updated_at": utcnow() + timedelta(seconds=1)}})
+    ticks = iter([True, False])
+    assert list(source.events(lambda: next(ticks))) == []
+    coll.update_one({"session_id": "a"}, {"$set": {"status": "COMPLETE", "updated_at": utcnow() + timedelta(seconds=2)}})
+    ticks = iter([True, False])
+    assert [e["status"] for e in source.events(lambda: next(ticks))] == ["COMPLETE"]
+
+
+
+def test_polling_source_pages_through_equal_timestamps(db):
+    source = PollingSource(interval=0)
+    source._since = source._since.replace(tzinfo=None) - timedelta(seconds=1)
+    # More saves than a page within the same millisecond
+    docs = [_doc(f"s{i:04d}", "COMPLETE") for i in range(source.page_size * 2 + 10)]
+    for d in docs:
+        d["updated_at"] = docs[0]["updated_at"]
+    db.survey_sessions.insert_many(docs)
+    ticks = iter([True] * 4 + [False])
+
+    events = list(source.events(lambda: next(ticks)))
+    assert sorted(e["session_id"] for e in events) == [d["session_id"] for d in docs]
+    assert all("_id" not in e for e in events)
+
+def test_memory_source_drops_backlog_on_reset():
+    source = MemorySource()
+    source.publish({"status": "IN_PROGRESS"})
+    source.reset()
+    assert source._q.empty()
+
+
+async def _next_event(body) -> dict:
+    while True:
+        chunk = await asyncio.wait_for(body.__anext__(), timeout=5)
+        if chunk.startswith(b"event: status"):
+            return orjson.loads(chunk.split(b"data: ", 1)[1])
+
+
+def test_sse_stream_reports_session_lifecycle(db, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    progress = ProgressFeed(MemorySource())
+    monkeypatch.setattr(feed, "FEED", progress)
+    monkeypatch.setattr(main, "FEED", progress)
+    client = TestClient(main.app)
+
+    async def scenario():
+        response = await main.stream_progress()
+        body = response.body_iterator
+        assert await body.__anext__() == b"retry: 5000\n\n"  # subscribed
+
+        sid = (await asyncio.to_thread(client.post, "/sessions")).json()["session_id"]
+        created = await _next_event(body)
+
+        def answer_all():
+            nxt = "intro__1"
+            answers = {"ProjectTeam": "Team A"}
+            while nxt:
+                r = client.post(f"/sessions/{sid}/instances/{nxt}/answers", json={"answers": answers}).json()
+                nxt, answers = r.get("next_instance_id"), {"x": 1}
+            client.post(f"/sessions/{sid}/submit")
+
+        await asyncio.to_thread(answer_all)
+        completed = await _next_event(body)
+        submitted = await _next_event(body)
+        await body.aclose()
+        return sid, created, completed, submitted
+
+    sid, created, completed, submitted = asyncio.run(scenario())
+    assert created["session_id"] == sid and created["status"] == "IN_PROGRESS"
+    # No events for the answer saves in between
+    assert completed["status"] == "COMPLETE"
+    assert completed["team_name"] == "Team A"
+    assert submitted["status"] == "SUBMITTED"
+    assert submitted["submitted_at"] is not None
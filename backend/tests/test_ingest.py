@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import io
+
+from app.ingest import apply_diff, diff_roster, read_export, roster_index
+from app.state import Member
+
+HEADER = "name,canvas_user_id,user_id,sections,group_name\n"
+
+
+def _roster(*members_by_team):
+    return {
+        team: {"mentor_name": f"Mentor {team}", "members": tuple(members)}
+        for team, members in members_by_team
+    }
+
+
+def _member(uid, name, *sections):
+    return Member(id=name.lower().replace(", ", "_"), name=name, user_id=uid, sections=tuple(sorted(sections)))
+
+
+def _diff(teams, csv_rows, full=False):
+    incoming, sections = read_export(io.StringIO(HEADER + csv_rows))
+    index = roster_index(teams)
+    return diff_roster(index, incoming, sections, full=full), index
+
+
+ANA = _member("1", "Lee, Ana", "S1", "S2")
+BO = _member("2", "Kim, Bo", "S2")
+CY = _member("3", "Diaz, Cy", "S1")
+TEAMS = _roster(("Team A", [ANA, BO]), ("Team B", [CY]))
+
+
+def test_read_export_merges_sections_per_student():
+    incoming, sections = read_export(io.StringIO(
+        HEADER
+        + '"Lee, Ana",10,1,S1,A\n'
+        + '"Lee, Ana",10,1,S2,A\n'
+        + '"No Group, Dee",11,4,S2,\n'
+        + ",12,,S3,A\n"
+    ))
+    assert sections == {"S1", "S2"}
+    assert incoming["1"].sections == {"S1", "S2"}
+    assert incoming["1"].team_name == "Team A"
+    assert incoming["4"].team_name is None
+    assert set(incoming) == {"1", "4"}
+
+
+def test_unchanged_export_is_empty_diff():
+    diff, _ = _diff(TEAMS, '"Lee, Ana",10,1,"S1, S2",A\n"Kim, Bo",11,2,S2,A\n"Diaz, Cy",12,3,S1,B\n')
+    assert diff.summary() == {"adds": 0, "moves": 0, "removes": 0}
+
+
+def test_missing_from_one_section_keeps_other_sections():
+    # S2-only export without Ana: she is still enrolled in S1
+    diff, index = _diff(TEAMS, '"Kim, Bo",11,2,S2,A\n')
+    assert diff.removes == []
+    assert [(uid, team, inc.sections) for uid, team, inc in diff.moves] == [("1", "Team A", {"S1"})]
+
+    teams = apply_diff(TEAMS, diff, index)
+    ana = next(m for m in teams["Team A"]["members"] if m.user_id == "1")
+    assert ana.sections == ("S1",)
+    assert ana.id == ANA.id
+
+
+def test_listed_in_one_section_keeps_the_other():
+    # S1-only export listing Ana (and Cy): her S2 enrolment is not this export's to drop
+    diff, _ = _diff(TEAMS, '"Lee, Ana",10,1,S1,A\n"Diaz, Cy",12,3,S1,B\n')
+    assert diff.summary() == {"adds": 0, "moves": 0, "removes": 0}
+
+
+def test_missing_from_only_section_is_removed():
+    diff, index = _diff(TEAMS, '"Lee, Ana",10,1,S2,A\n')
+    assert diff.removes == [("2", "Team A")]
+    teams = apply_diff(TEAMS, diff, index)
+    assert [m.user_id for m in teams["Team A"]["members"]] == ["1"]
+    # Team B (S1) is outside the export and shared unchanged
+    assert teams["Team B"] is TEAMS["Team B"]
+
+
+def test_missing_from_every_section_is_removed():
+    diff, _ = _diff(TEAMS, '"Kim, Bo",11,2,"S1, S2",A\n"Diaz, Cy",12,3,S1,B\n')
+    assert diff.removes == [("1", "Team A")]
+
+
+def test_full_export_replaces_sections():
+    diff, _ = _diff(TEAMS, '"Lee, Ana",10,1,S1,A\n"Kim, Bo",11,2,S2,A\n', full=True)
+    assert diff.removes == [("3", "Team B")]
+    assert [(uid, inc.sections) for uid, _, inc in diff.moves] == [("1", {"S1"})]
+
+
+def test_group_change_is_a_move_and_new_student_an_add():
+    diff, index = _diff(TEAMS, '"Lee, Ana",10,1,S2,A\n"Kim, Bo",11,2,S2,B\n"Ng, Eve",13,5,S2,A\n')
+    assert [(uid, team, inc.team_name) for uid, team, inc in diff.moves] == [("2", "Team A", "Team B")]
+    assert [(uid, inc.team_name) for uid, inc in diff.adds] == [("5", "Team A")]
+
+    teams = apply_diff(TEAMS, diff, index)
+    assert {m.user_id for m in teams["Team A"]["members"]} == {"1", "5"}
+    assert {m.user_id for m in teams["Team B"]["members"]} == {"2", "3"}
+
+
+def test_ungrouped_student_is_removed():
+    diff, _ = _diff(TEAMS, '"Kim, Bo",11,2,S2,\n')
+    assert ("2", "Team A") in diff.removes
+
+
+def _client(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app import auth
+    from app.main import app
+
+    monkeypatch.setattr(auth, "ADMIN_TOKEN", "secret")
+    return TestClient(app)
+
+
+def test_admin_roster_streams_upload(roster, monkeypatch):
+    client = _client(monkeypatch)
+    team = roster.team_data()["Team A"]
+    first = team["members"][0]
+    body = HEADER + f'"{first.name}",0,{first.user_id},{",".join(first.sections)},B\n'
+
+    r = client.post("/admin/roster?dry_run=true", files={"file": ("export.csv", body.encode("utf-8-sig"))})
+    assert r.status_code == 403
+
+    r = client.post(
+        "/admin/roster",
+        params={"dry_run": "true"},
+        files={"file": ("export.csv", body.encode("utf-8-sig"))},
+        headers={"X-Admin-Token": "secret"},
+    )
+    assert r.status_code == 200
+    assert r.json()["moves"] == 1
+    assert r.json()["rows"] == 1
+    # Dry run: the roster is untouched
+    assert roster.team_data()["Team A"] is team
+
+    r = client.post(
+        "/admin/roster",
+        files={"file": ("export.csv", body.encode("utf-8"))},
+        headers={"X-Admin-Token": "secret"},
+    )
+    assert r.status_code == 200
+    assert first.user_id in {m.user_id for m in roster.team_data()["Team B"]["members"]}
+
+
+def test_admin_roster_rejects_undecodable_upload(roster, monkeypatch):
+    client = _client(monkeypatch)
+    r = client.post(
+        "/admin/roster",
+        files={"file": ("export.csv", HEADER.encode() + b'"\xff\xfe",0,1,S1,A\n')},
+        headers={"X-Admin-Token": "secret"},
+    )
+    assert r.status_code == 400
+
+
+def test_admin_roster_needs_mongo_source_for_shared_store(roster, monkeypatch):
+    from app import main
+
+    client = _client(monkeypatch)
+    monkeypatch.setattr(main.STORE, "shared", True)
+    body = HEADER + '"Kim, Bo",11,2,S2,\n'
+    r = client.post("/admin/roster", files={"file": ("export.csv", body.encode())}, headers={"X-Admin-Token": "secret"})
+    assert r.status_code == 409
+    r = client.post(
+        "/admin/roster?dry_run=true", files={"file": ("export.csv", body.encode())}, headers={"X-Admin-Token": "secret"}
+    )
+    assert r.status_code == 200
+
+
+def _published(db, monkeypatch):
+    """Mongo roster source, published from the cached CSV roster."""
+    from app import data, ingest, teams
+
+    monkeypatch.setattr(ingest, "ROSTER_SOURCE", "mongo")
+    return teams.sync_teams(data.team_data(), None)
+
+
+def test_mongo_ingest_diffs_published_roster(roster, db, monkeypatch):
+    from app import teams
+    from app.ingest import ingest_roster
+
+    base = _published(db, monkeypatch)
+    # Another node publishes a team this process has not loaded yet
+    newer = {**roster.team_data(), "Team Z": {"mentor_name": "Mentor Z", "members": (ANA,)}}
+    version = teams.sync_teams(newer, base, only={"Team Z"})
+    assert "Team Z" not in roster.team_data()
+
+    first = roster.team_data()["Team A"]["members"][0]
+    body = HEADER + f'"{first.name}",0,{first.user_id},{",".join(first.sections)},B\n'
+    result = ingest_roster(io.StringIO(body))
+    assert result["moves"] == 1
+    published = teams.load_teams()
+    assert "Team Z" in published
+    assert first.user_id in {m.user_id for m in published["Team B"]["members"]}
+    assert teams.roster_version() not in (base, version)
+    assert roster.team_data() == published
+    # The lease is released
+    assert db.app_meta.find_one({"_id": teams.ROSTER_LOCK_ID}) is None
+
+
+def test_mongo_ingest_conflicts(roster, db, monkeypatch):
+    import pytest
+
+    from app import teams
+    from app.ingest import ingest_roster
+
+    base = _published(db, monkeypatch)
+    body = HEADER + '"Kim, Bo",11,2,S2,\n'
+    with teams.roster_lock():
+        with pytest.raises(teams.RosterConflict):
+            ingest_roster(io.StringIO(body))
+
+    # Publishing over a version other than the one read is refused
+    changed = {**roster.team_data(), "Team Z": {"mentor_name": "Mentor Z", "members": (ANA,)}}
+    teams.sync_teams(changed, base)
+    with pytest.raises(teams.RosterConflict):
+        teams.sync_teams(roster.team_data(), base)
+    assert "Team Z" in teams.load_teams()
+
+    client = _client(monkeypatch)
+    with teams.roster_lock():
+        r = client.post(
+            "/admin/roster", files={"file": ("export.csv", body.encode())}, headers={"X-Admin-Token": "secret"}
+        )
+    assert r.status_code == 409
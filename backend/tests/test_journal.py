@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import threading
+from datetime import timedelta
+
+import pytest
+
+from app.engine import SESSIONS, apply_answers
+from app.journal import Journal, JournalReplayer, rebuild_sessions
+from app.persist import create_session_doc, save_session_snapshot, utcnow
+from app.state import INTRO_ITEM
+from app.store import JournalStore
+
+TEAM = "Team A"
+
+
+def _store(path) -> JournalStore:
+    store = JournalStore(Journal(path, fsync_ms=0))
+    store.start()
+    return store
+
+
+def _answer(store: JournalStore, session_id: str, instance_id: str, answers) -> None:
+    s = store.get(session_id)
+    inst = INTRO_ITEM if instance_id == INTRO_ITEM.instance_id else s.find(instance_id)
+    with store.mutation(session_id, "answers", instance_id=instance_id, answers=answers):
+        apply_answers(s, inst, answers)
+
+
+def _fill(store: JournalStore) -> str:
+    s = store.create()
+    _answer(store, s.session_id, INTRO_ITEM.instance_id, {"ProjectTeam": TEAM})
+    _answer(store, s.session_id, s.plan[1].instance_id, {"MentorNameOverride": "x"})
+    return s.session_id
+
+
+def _restart(store: JournalStore, path) -> JournalStore:
+    store.replayer._stop.set()
+    store.journal.close()
+    SESSIONS.clear()
+    return _store(path)
+
+
+def test_restart_rebuilds_sessions(tmp_path, db):
+    store = _store(tmp_path)
+    sid = _fill(store)
+    before = SESSIONS[sid]
+    answers, cursor, plan = dict(before.answers), before.cursor, before.plan
+
+    store = _restart(store, tmp_path)
+    after = SESSIONS[sid]
+    assert after.answers == answers
+    assert after.cursor == cursor
+    assert after.plan == plan
+    assert after.team_name == TEAM
+    store.stop()
+
+
+def test_torn_tail_is_ignored(tmp_path, db):
+    store = _store(tmp_path)
+    sid = _fill(store)
+    cursor = SESSIONS[sid].cursor
+    store.replayer._stop.set()
+    store.journal.close()
+    with sorted(tmp_path.glob("seg-*.log"))[-1].open("ab") as fh:
+        fh.write(b'{"seq": 99, "op": "ans')
+
+    SESSIONS.clear()
+    store = _store(tmp_path)
+    assert SESSIONS[sid].cursor == cursor
+    store.stop()
+
+
+def test_drain_writes_snapshot_with_sync_time(tmp_path, db):
+    store = _store(tmp_path)
+    sid = _fill(store)
+    with store.mutation(sid, "submit"):
+        SESSIONS[sid].status = "SUBMITTED"
+
+    assert store.replayer.drain_once() == 1
+    doc = db.survey_sessions.find_one({"session_id": sid})
+    assert doc["status"] == "SUBMITTED"
+    assert doc["team_name"] == TEAM
+    assert doc["cursor"] == SESSIONS[sid].cursor
+    assert doc["answers"]["intro"] == {"ProjectTeam": TEAM}
+    assert doc["submitted_at"] is not None
+    assert store.journal.pending() == []
+    assert store.journal.checkpoint > 0
+
+    # Nothing new: draining again is a no-op
+    assert store.replayer.drain_once() == 0
+    store.stop()
+
+
+def test_drain_after_outage_is_not_expired(tmp_path, db):
+    store = _store(tmp_path)
+    sid = _fill(store)
+    # Journaled long before Mongo came back
+    for r in store.journal._pending:
+        r["ts"] -= 3600
+    started = utcnow().replace(tzinfo=None) - timedelta(seconds=1)
+    store.replayer.drain_once()
+    doc = db.survey_sessions.find_one({"session_id": sid})
+    assert doc["updated_at"] >= started
+    store.stop()
+
+
+def test_drain_keeps_records_pending_while_mongo_is_down(tmp_path, db, monkeypatch):
+    store = _store(tmp_path)
+    _fill(store)
+
+    def down(*args, **kwargs):
+        raise ConnectionError("mongo down")
+
+    monkeypatch.setattr("app.journal.save_session_snapshot", down)
+    with pytest.raises(ConnectionError):
+        store.replayer.drain_once()
+    assert len(store.journal.pending()) == 3
+
+    monkeypatch.setattr("app.journal.save_session_snapshot", save_session_snapshot)
+    assert store.replayer.drain_once() == 1
+    assert store.journal.pending() == []
+    store.stop()
+
+
+def test_snapshot_waits_for_applying_mutation(tmp_path, db, monkeypatch):
+    store = _store(tmp_path)
+    sid = _fill(store)
+    seen = []
+    monkeypatch.setattr("app.journal.save_session_snapshot", lambda s, **kw: seen.append(s.status))
+
+    entered, release = threading.Event(), threading.Event()
+
+    def mutate():
+        with store.mutation(sid, "submit"):
+            entered.set()
+            release.wait(5)
+            SESSIONS[sid].status = "SUBMITTED"
+
+    t = threading.Thread(target=mutate)
+    t.start()
+    entered.wait(5)
+    drainer = threading.Thread(target=store.replayer.drain_once)
+    drainer.start()
+    drainer.join(0.2)
+    # The snapshot is blocked on the mutation, not taken half-way through it
+    assert drainer.is_alive()
+    release.set()
+    t.join()
+    drainer.join()
+    assert seen == ["SUBMITTED"]
+    store.stop()
+
+
+def test_pruned_session_is_loaded_from_mongo(tmp_path, db):
+    store = _store(tmp_path)
+    sid = _fill(store)
+    store.replayer.drain_once()
+    expected = SESSIONS[sid].answers
+
+    # Segments pruned, as after JOURNAL_RETAIN_SECONDS
+    store.replayer._stop.set()
+    store.journal.close()
+    for seg in tmp_path.glob("seg-*.log"):
+        seg.unlink()
+    SESSIONS.clear()
+
+    store = _store(tmp_path)
+    assert sid not in SESSIONS
+    s = store.get(sid)
+    assert s is not None
+    assert s.answers == expected
+    assert s.team_name == TEAM
+    store.stop()
+
+
+def test_records_after_checkpoint_apply_on_top_of_mongo(tmp_path, db):
+    journal = Journal(tmp_path, fsync_ms=0)
+    journal.open()
+    create_session_doc("s1")
+    journal.checkpoint = 1
+    records = [
+        {"seq": 1, "ts": 0, "op": "answers", "session_id": "s1",
+         "instance_id": INTRO_ITEM.instance_id, "answers": {"ProjectTeam": "Team B"}},
+        {"seq": 2, "ts": 0, "op": "submit", "session_id": "s1"},
+    ]
+    from app.store import _load_from_mongo
+
+    assert rebuild_sessions(records, checkpoint=journal.checkpoint, load=_load_from_mongo) == 1
+    # seq 1 is covered by Mongo (which has no team yet); only the submit is replayed
+    assert SESSIONS["s1"].status == "SUBMITTED"
+    assert SESSIONS["s1"].team_name is None
+    journal.close()
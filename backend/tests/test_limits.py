@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import pytest
+from fastapi import HTTPException
+from pymongo.errors import ServerSelectionTimeoutError
+
+from app import limits
+from app.limits import Admission, MemoryBackend, MongoBackend, parse_limit
+
+
+def test_parse_limit():
+    assert parse_limit("10/60") == (10.0, 10 / 60)
+
+
+def test_memory_bucket_allows_burst_then_waits():
+    backend = MemoryBackend()
+    burst, rate = parse_limit("3/60")
+    assert [backend.take("k", burst, rate) for _ in range(3)] == [0, 0, 0]
+    assert backend.take("k", burst, rate) == pytest.approx(20, rel=0.01)
+    # Other clients have their own bucket
+    assert backend.take("other", burst, rate) == 0
+
+
+def test_memory_backend_evicts_least_recent_keys():
+    backend = MemoryBackend(max_keys=2)
+    for key in ("a", "b", "c"):
+        backend.take(key, 1, 1)
+    assert list(backend._buckets) == ["b", "c"]
+
+
+class _Rates:
+    def __init__(self, error=None):
+        self.calls = 0
+        self.error = error
+
+    def find_one_and_update(self, *args, **kwargs):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return {"allowed": True, "tokens": 1.0}
+
+
+def _mongo_backend(monkeypatch, rates, admission=None):
+    monkeypatch.setattr(limits, "get_mongo", lambda: type("Db", (), {"rate_limits": rates})())
+    return MongoBackend(timeout_ms=50, breaker_seconds=60, admission=admission or Admission(high_water=10))
+
+
+def test_mongo_backend_holds_an_admission_slot(monkeypatch):
+    admission = Admission(high_water=10)
+    rates = _Rates()
+    backend = _mongo_backend(monkeypatch, rates, admission)
+    assert backend.take("k", 1, 1) == 0
+    assert rates.calls == 1
+    assert admission.admitted == 0
+
+
+def test_mongo_backend_falls_back_and_opens_breaker(monkeypatch):
+    rates = _Rates(ServerSelectionTimeoutError("down"))
+    backend = _mongo_backend(monkeypatch, rates)
+
+    assert backend.take("k", 1, 1 / 60) == 0  # per-process bucket
+    assert backend.take("k", 1, 1 / 60) > 0  # ... which still limits
+    # Breaker open: Mongo was only tried once
+    assert rates.calls == 1
+    assert backend.admission.admitted == 0
+
+
+def test_mongo_backend_uses_local_buckets_when_saturated(monkeypatch):
+    admission = Admission(high_water=1)
+    rates = _Rates()
+    backend = _mongo_backend(monkeypatch, rates, admission)
+    assert admission.try_enter()
+    assert backend.take("k", 1, 1) == 0
+    assert rates.calls == 0
+    admission.leave()
+
+
+def test_admission_sheds_at_high_water():
+    admission = Admission(high_water=1)
+    held = admission()
+    next(held)
+    with pytest.raises(HTTPException) as e:
+        next(admission())
+    assert e.value.status_code == 503
+    held.close()
+    assert admission.admitted == 0
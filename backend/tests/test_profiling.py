@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import auth, main, profiling
+from app.profiling import FORMATS, ProfileMiddleware, profiled
+
+ADMIN = {"X-Admin-Token": "secret"}
+
+
+@pytest.fixture
+def profiles(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "ENABLED", True)
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(auth, "ADMIN_TOKEN", "secret")
+    return tmp_path
+
+
+def _leaf(n):
+    return sorted(range(n), reverse=True)
+
+
+def _work(n):
+    return sum(len(_leaf(i)) for i in range(n))
+
+
+def _profiled_app():
+    app = FastAPI()
+    app.add_middleware(ProfileMiddleware)
+
+    @app.get("/work")
+    @profiled
+    def work(n: int = 50):
+        return {"total": _work(n)}
+
+    return app
+
+
+def test_profiled_request_writes_balanced_profile(profiles):
+    client = TestClient(_profiled_app())
+    assert client.get("/work", headers={"X-Profile": "1", **ADMIN}).json() == {"total": 1225}
+
+    [listed] = main.get_profiles()["profiles"]
+    admin = TestClient(main.app)
+    r = admin.get(f"/admin/profiles/{listed['id']}", headers=ADMIN)
+    assert r.status_code == 200
+    doc = r.json()
+    frames = doc["shared"]["frames"]
+    events = doc["profiles"][0]["events"]
+
+    stack = []
+    for e in events:
+        if e["type"] == "O":
+            stack.append(e["frame"])
+        else:
+            assert stack.pop() == e["frame"]
+    assert stack == []
+    assert [e["at"] for e in events] == sorted(e["at"] for e in events)
+    assert events[-1]["at"] <= doc["profiles"][0]["endValue"]
+    opened = {frames[e["frame"]]["name"] for e in events}
+    assert "_leaf" in opened
+    assert not opened & {"Tracer.stop", "sys.setprofile"}
+
+    collapsed = admin.get(f"/admin/profiles/{listed['id']}?format=collapsed", headers=ADMIN).text
+    assert collapsed.strip()
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in collapsed.splitlines())
+    assert any("_work (test_profiling.py" in line for line in collapsed.splitlines())
+
+
+def test_profiling_needs_admin_token(profiles):
+    client = TestClient(_profiled_app())
+    client.get("/work", headers={"X-Profile": "1"})
+    client.get("/work", headers={"X-Profile": "1", "X-Admin-Token": "wrong"})
+    assert list(profiles.iterdir()) == []
+
+
+def test_profile_downloads(profiles):
+    (profiles / "secret.txt").write_text("x")
+    client = TestClient(main.app)
+    assert client.get("/admin/profiles").status_code == 403
+    assert client.get("/admin/profiles/20260101T000000-get-00000000").status_code == 403
+
+    for profile_id in ("..%2Fx", "..", "20260101T000000-get-0000000g"):
+        assert client.get(f"/admin/profiles/{profile_id}", headers=ADMIN).status_code == 404
+    assert profiling.profile_path("../x", "speedscope") is None
+    assert profiling.profile_path("20260101T000000-get-00000000", "../secret.txt") is None
+
+
+def test_prune_keeps_newest(profiles, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_MAX_FILES", 2)
+    ids = [f"20260101T00000{i}-get-0000000{i}" for i in range(4)]
+    for i, profile_id in enumerate(ids):
+        for suffix in FORMATS.values():
+            path = profiles / f"{profile_id}{suffix}"
+            path.write_text("{}")
+            os.utime(path, (1000 + i, 1000 + i))
+
+    profiling._prune(profiles)
+    assert sorted(p.name for p in profiles.iterdir()) == sorted(
+        f"{profile_id}{suffix}" for profile_id in ids[2:] for suffix in FORMATS.values()
+    )
+
+
+def test_profiled_is_a_no_op_when_disabled(monkeypatch):
+    monkeypatch.setattr(profiling, "ENABLED", False)
+    assert profiled(_work) is _work
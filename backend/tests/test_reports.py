@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import threading
+import time
+from datetime import timedelta
+
+import pytest
+
+from app import main
+from app.persist import utcnow
+from app.reports import SWRCache, build_progress_report, status_counts, submissions
+
+
+def _session(sid, status, team_key, submitted_delta=None):
+    submitted_at = None if submitted_delta is None else utcnow() + timedelta(seconds=submitted_delta)
+    return {"session_id": sid, "status": status, "team_key": team_key, "submitted_at": submitted_at}
+
+
+@pytest.fixture
+def sessions(db):
+    db.survey_sessions.insert_many([
+        _session("a1", "SUBMITTED", "team_a", submitted_delta=-60),
+        _session("a2", "SUBMITTED", "team_a", submitted_delta=-10),
+        _session("a3", "IN_PROGRESS", "team_a"),
+        _session("b1", "COMPLETE", "team_b"),
+        _session("n1", "IN_PROGRESS", None),  # intro not answered yet
+    ])
+    return db.survey_sessions
+
+
+def test_status_counts_by_team(sessions):
+    assert status_counts(sessions) == {
+        "team_a": {"SUBMITTED": 2, "IN_PROGRESS": 1},
+        "team_b": {"COMPLETE": 1},
+    }
+
+
+def test_submissions_keep_latest(sessions):
+    latest = sessions.find_one({"session_id": "a2"})["submitted_at"]
+    result = submissions(sessions, ["team_a", "team_b"])
+    assert set(result) == {"team_a"}
+    assert result["team_a"]["submissions"] == 2
+    assert result["team_a"]["last_submitted_at"] == latest
+
+
+def test_progress_report_covers_roster(sessions, roster):
+    report = build_progress_report()
+    teams = {t["team_key"]: t for t in report["teams"]}
+    assert len(teams) == len(roster.team_data())
+    assert report["totals"] == {"IN_PROGRESS": 1, "COMPLETE": 1, "SUBMITTED": 2}
+    assert teams["team_a"]["counts"] == {"IN_PROGRESS": 1, "COMPLETE": 0, "SUBMITTED": 2}
+    assert teams["team_a"]["submissions"] == 2
+    assert teams["team_b"]["last_submitted_at"] is None
+    pending = {t["team_key"] for t in report["mentors_not_submitted"]}
+    assert "team_b" in pending and "team_a" not in pending
+    assert len(pending) == len(teams) - 1
+
+
+class _Loader:
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self):
+        self.release.wait(5)
+        if self.fail:
+            raise RuntimeError("mongo down")
+        self.calls += 1
+        return self.calls
+
+
+def _age(cache, seconds):
+    cache._loaded_at = time.monotonic() - seconds
+
+
+def _wait_idle(cache):
+    deadline = time.monotonic() + 5
+    while cache._refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not cache._refreshing
+
+
+def test_swr_serves_fresh_value():
+    loader = _Loader()
+    cache = SWRCache(loader, ttl=10, stale_ttl=60)
+    assert cache.get() == 1
+    assert cache.get() == 1
+    assert loader.calls == 1
+
+
+def test_swr_serves_stale_while_refreshing():
+    loader = _Loader()
+    cache = SWRCache(loader, ttl=10, stale_ttl=60)
+    cache.get()
+    _age(cache, 30)
+
+    loader.release.clear()
+    assert cache.get() == 1  # served at once, refresh blocked in the background
+    assert cache.get() == 1
+    loader.release.set()
+    _wait_idle(cache)
+    assert loader.calls == 2
+    assert cache.get() == 2
+
+
+def test_swr_reloads_inline_when_too_old():
+    loader = _Loader()
+    cache = SWRCache(loader, ttl=10, stale_ttl=60)
+    cache.get()
+    _age(cache, 120)
+    assert cache.get() == 2
+
+    cache.invalidate()
+    assert cache.get() == 3
+
+
+def test_swr_loader_failure():
+    loader = _Loader()
+    cache = SWRCache(loader, ttl=10, stale_ttl=60)
+    loader.fail = True
+    with pytest.raises(RuntimeError):
+        cache.get()
+
+    loader.fail = False
+    cache.get()
+    loader.fail = True
+    # A failed background refresh keeps serving the stale value and can be retried
+    _age(cache, 30)
+    assert cache.get() == 1
+    _wait_idle(cache)
+    assert cache.get() == 1
+    _wait_idle(cache)
+    # Past the stale window the failure reaches the caller
+    _age(cache, 120)
+    with pytest.raises(RuntimeError):
+        cache.get()
+
+
+def test_reports_require_admin_token(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app import auth
+
+    monkeypatch.setattr(auth, "ADMIN_TOKEN", "secret")
+    monkeypatch.setattr(main, "PROGRESS_REPORT", type("Report", (), {"get": lambda self: {"teams": []}})())
+    client = TestClient(main.app)
+
+    for path in ("/reports/progress", "/reports/progress/stream"):
+        assert client.get(path).status_code == 403
+        assert client.get(path, headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert client.get("/reports/progress", headers={"X-Admin-Token": "secret"}).json() == {"teams": []}
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+from app.engine import SESSIONS, apply_answers, create_session
+from app.ingest import ingest_roster
+from app.journal import Journal, rebuild_sessions
+from app.persist import create_session_doc, save_instance_answers, save_intro_and_materialise
+from app.state import INTRO_ITEM, MEMBER_EVALUATION
+from app.store import JournalStore, session_from_doc
+
+TEAM = "Team A"
+
+
+def _without_first_member(data, version):
+    teams = dict(data.team_data())
+    team = teams[TEAM]
+    teams[TEAM] = {**team, "members": team["members"][1:]}
+    data.replace_roster(teams, version)
+    return team["members"][0]
+
+
+def _at_second_member(s):
+    """Posts answers up to (not including) the second member evaluation."""
+    apply_answers(s, INTRO_ITEM, {"ProjectTeam": TEAM})
+    evals = [i for i, item in enumerate(s.plan) if item.kind == MEMBER_EVALUATION]
+    while s.cursor < evals[1]:
+        apply_answers(s, s.plan[s.cursor], {"x": 1})
+    return s.plan[s.cursor].instance_id
+
+
+def test_session_follows_roster_change(roster):
+    from app.store import refresh_sessions
+
+    s = create_session()
+    nxt = _at_second_member(s)
+    removed = _without_first_member(roster, "test-1")
+
+    assert refresh_sessions({TEAM}) == 1
+    assert removed not in s.members
+    assert s.plan[s.cursor].instance_id == nxt
+
+
+def test_roster_version_change_notifies_listeners(roster, monkeypatch):
+    import app.teams
+
+    teams = dict(roster.team_data())
+    published = {"version": "v1", "teams": teams}
+    monkeypatch.setattr(roster, "ROSTER_SOURCE", "mongo")
+    monkeypatch.setattr(app.teams, "roster_version", lambda: published["version"])
+    monkeypatch.setattr(app.teams, "load_teams", lambda: published["teams"])
+    seen = []
+    roster.on_roster_change(seen.append)
+
+    roster.check_roster()
+    # Same content under a new version: nothing to refresh
+    assert seen == []
+
+    published["teams"] = {**teams, TEAM: {**teams[TEAM], "members": teams[TEAM]["members"][1:]}}
+    published["version"] = "v2"
+    roster.check_roster()
+    assert seen == [{TEAM}]
+
+
+def test_requests_never_wait_on_mongo_roster_checks(roster, monkeypatch):
+    import app.teams
+
+    def unreachable():
+        raise AssertionError("roster version checked on the request path")
+
+    monkeypatch.setattr(roster, "ROSTER_SOURCE", "mongo")
+    monkeypatch.setattr(app.teams, "roster_version", unreachable)
+    cached = roster.team_data()
+    assert roster.get_team(TEAM) is cached[TEAM]
+    assert roster.roster_version() == roster._roster["version"]
+
+
+def test_shared_session_cursor_is_carried_to_new_plan(roster, db):
+    s = create_session()
+    nxt = _at_second_member(s)
+    create_session_doc(s.session_id)
+    save_intro_and_materialise(
+        s.session_id, TEAM, s.mentor_name, [m.to_dict() for m in s.members], s.mongo_plan(), s.answers["intro__1"]
+    )
+    item = s.plan[s.cursor - 1]
+    save_instance_answers(
+        s.session_id, item.kind, item.instance_id, {"x": 1}, item.bindings, cursor=s.cursor, plan=s.mongo_plan()
+    )
+
+    # Another process drops a member the mentor has already evaluated
+    _without_first_member(roster, "test-2")
+    loaded = session_from_doc(db.survey_sessions.find_one({"session_id": s.session_id}))
+    assert loaded.plan[loaded.cursor].instance_id == nxt
+    assert loaded.cursor == s.cursor - 1
+
+
+def test_refresh_is_journaled_and_replayed(roster, tmp_path, monkeypatch):
+    import app.store
+
+    journal = Journal(tmp_path, fsync_ms=0)
+    journal.open()
+    store = JournalStore(journal)
+    monkeypatch.setattr(app.store, "STORE", store)
+
+    s = store.create()
+    with store.mutation(s.session_id, "answers", instance_id="intro__1", answers={"ProjectTeam": TEAM}):
+        apply_answers(s, INTRO_ITEM, {"ProjectTeam": TEAM})
+    _without_first_member(roster, "test-3")
+    assert app.store.refresh_sessions({TEAM}) == 1
+    expected = (s.plan, s.cursor)
+    journal.close()
+
+    SESSIONS.clear()
+    reopened = Journal(tmp_path)
+    records = reopened.open()
+    reopened.close()
+    assert records[-1]["op"] == "refresh"
+    rebuild_sessions(records)
+    s = SESSIONS[s.session_id]
+    assert (s.plan, s.cursor) == expected
+
+
+def test_ingest_refreshes_sessions(roster):
+    s = create_session()
+    _at_second_member(s)
+    first, *rest = roster.team_data()[TEAM]["members"]
+    # An export of the first member's section that no longer lists them
+    section = first.sections[0]
+    rows = ["name,canvas_user_id,user_id,sections,group_name\n"]
+    rows += [f'"{m.name}",0,{m.user_id},{section},A\n' for m in rest if section in m.sections]
+
+    result = ingest_roster(rows)
+    assert TEAM in result["teams_affected"]
+    assert result["sessions_refreshed"] == 1
+    assert first not in s.members
+
+
+def _without_team(data, version):
+    teams = dict(data.team_data())
+    del teams[TEAM]
+    data.replace_roster(teams, version)
+
+
+def test_dissolved_team_keeps_stored_plan(roster, db):
+    s = create_session()
+    nxt = _at_second_member(s)
+    create_session_doc(s.session_id)
+    save_intro_and_materialise(
+        s.session_id, TEAM, s.mentor_name, [m.to_dict() for m in s.members], s.mongo_plan(), s.answers["intro__1"]
+    )
+    item = s.plan[s.cursor - 1]
+    save_instance_answers(
+        s.session_id, item.kind, item.instance_id, {"x": 1}, item.bindings, cursor=s.cursor, plan=s.mongo_plan()
+    )
+
+    # An ingest removes every student of the team
+    _without_team(roster, "test-4")
+    loaded = session_from_doc(db.survey_sessions.find_one({"session_id": s.session_id}))
+    assert (loaded.team_name, loaded.mentor_name) == (TEAM, s.mentor_name)
+    assert [m.to_dict() for m in loaded.members] == [m.to_dict() for m in s.members]
+    assert [i.to_dict() for i in loaded.plan] == [i.to_dict() for i in s.plan]
+    assert loaded.plan[loaded.cursor].instance_id == nxt
+    assert loaded.answers[item.instance_id] == {"x": 1}
+
+
+def test_dissolved_team_intro_is_replayed(roster, tmp_path):
+    from app.journal import team_record
+
+    journal = Journal(tmp_path, fsync_ms=0)
+    journal.open()
+    store = JournalStore(journal)
+    s = store.create()
+    team = roster.get_team(TEAM)
+    with store.mutation(
+        s.session_id, "answers", instance_id="intro__1", answers={"ProjectTeam": TEAM}, team=team_record(team)
+    ):
+        apply_answers(s, INTRO_ITEM, {"ProjectTeam": TEAM})
+    expected = (s.plan, s.cursor)
+    journal.close()
+
+    _without_team(roster, "test-5")
+    SESSIONS.clear()
+    reopened = Journal(tmp_path)
+    records = reopened.open()
+    reopened.close()
+    rebuild_sessions(records)
+    s = SESSIONS[s.session_id]
+    assert (s.plan, s.cursor) == expected
+    assert s.members == team["members"]
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import json
+import re
+
+import pytest
+
+from app import surveys
+from app.state import INTRO_ITEM
+
+
+@pytest.fixture
+def survey_dir(tmp_path, monkeypatch):
+    definition = json.loads((surveys.SURVEYS_DIR / "capstone_final.json").read_text())
+    definition["survey_id"] = "tmp_survey"
+    (tmp_path / "tmp_survey.json").write_text(json.dumps(definition))
+    monkeypatch.setattr(surveys, "SURVEYS_DIR", tmp_path)
+    monkeypatch.setattr(surveys, "_loaded", {})
+    return tmp_path / "tmp_survey.json", definition
+
+
+def test_definitions_are_not_rechecked_within_interval(survey_dir, monkeypatch):
+    path, definition = survey_dir
+    monkeypatch.setattr(surveys, "SURVEY_CHECK_SECONDS", 3600)
+    first = surveys.get_survey("tmp_survey")
+    assert first.plan(())[0] == INTRO_ITEM
+
+    definition["version"] = 99
+    path.write_text(json.dumps(definition))
+    assert surveys.get_survey("tmp_survey") is first
+
+
+def test_changed_definition_is_recompiled_after_interval(survey_dir, monkeypatch):
+    path, definition = survey_dir
+    monkeypatch.setattr(surveys, "SURVEY_CHECK_SECONDS", 3600)
+    first = surveys.get_survey("tmp_survey")
+
+    definition["version"] = 99
+    path.write_text(json.dumps(definition))
+    surveys._loaded["tmp_survey"] = (first, float("-inf"))  # interval elapsed
+    second = surveys.get_survey("tmp_survey")
+    assert second is not first
+    assert second.version.startswith("99-")
+
+    # Unchanged file: the check keeps the compiled survey
+    surveys._loaded["tmp_survey"] = (second, float("-inf"))
+    assert surveys.get_survey("tmp_survey") is second
+
+
+def test_unknown_survey():
+    with pytest.raises(KeyError):
+        surveys.get_survey("../etc/passwd")
+
+
+def test_deleted_definition_is_unknown(survey_dir):
+    path, _ = survey_dir
+    first = surveys.get_survey("tmp_survey")
+    path.unlink()
+    surveys._loaded["tmp_survey"] = (first, float("-inf"))  # interval elapsed
+    with pytest.raises(KeyError):
+        surveys.get_survey("tmp_survey")
+    assert "tmp_survey" not in surveys._loaded
+
+
+def _legacy_plan(members):
+    """The plan engine.materialise_plan hard-coded before survey definitions."""
+    plan = [
+        {"instance_id": f"{kind}__1", "kind": kind, "bindings": {}}
+        for kind in ("intro", "mentor_confirmation", "overall_performance", "client_communication")
+    ]
+    for m in members:
+        plan.append({
+            "instance_id": f"member_evaluation__{m.id}",
+            "kind": "member_evaluation",
+            "bindings": {"member_id": m.id, "member_name": m.name},
+        })
+    plan.append({"instance_id": "director_comment__1", "kind": "director_comment", "bindings": {}})
+    return plan
+
+
+def _legacy_answer_path(kind, instance_id, bindings):
+    """Where persist.save_instance_answers wrote each block before survey definitions."""
+    if kind == "member_evaluation":
+        return f"answers.member_evaluations.{(bindings or {}).get('member_id') or instance_id}"
+    if kind in ("intro", "mentor_confirmation", "overall_performance", "client_communication", "director_comment"):
+        return f"answers.{kind}"
+    return f"answers.misc.{instance_id}"
+
+
+def test_capstone_final_matches_legacy_plan(roster):
+    survey = surveys.get_survey("capstone_final")
+    for team in roster.team_data().values():
+        members = team["members"]
+        plan = survey.plan(members)
+        assert [item.to_dict() for item in plan] == _legacy_plan(members)
+        for item in plan:
+            assert survey.answer_path(item.kind, item.instance_id, item.bindings) == _legacy_answer_path(
+                item.kind, item.instance_id, item.bindings
+            )
+
+    # Fallbacks: a member block without bindings, and unknown kinds
+    for kind, instance_id in (("member_evaluation", "member_evaluation__x"), ("other", "other__1")):
+        assert survey.answer_path(kind, instance_id) == _legacy_answer_path(kind, instance_id, None)
+
+
+def _definition(*blocks):
+    return {"survey_id": "s", "blocks": [{"kind": "intro", "template": "intro"}, *blocks]}
+
+
+@pytest.mark.parametrize("raw, message", [
+    ({"survey_id": "s", "blocks": [{"kind": "overall_performance", "template": "overall_performance"}]},
+     "first block must be 'intro'"),
+    (_definition({"kind": "intro", "template": "intro"}), "duplicate block kind 'intro'"),
+    (_definition({"kind": "x", "template": "nope"}), "unknown template 'nope'"),
+    (_definition({"kind": "x", "template": "member_evaluation", "repeat": "sections"}), "unsupported repeat 'sections'"),
+    (_definition({"kind": "x", "title": "X"}), "needs a template or title + elements"),
+    ({"survey_id": "s", "blocks": []}, "needs survey_id and blocks"),
+])
+def test_compile_survey_rejects(raw, message):
+    with pytest.raises(ValueError, match=re.escape(message)):
+        surveys.compile_survey(raw, version="1")
+
+
+def test_inline_blocks_fill_placeholders(roster):
+    from app.engine import create_session, materialise_plan
+
+    s = create_session("capstone_midterm")
+    materialise_plan(s, "Team A")
+    survey = surveys.get_survey("capstone_midterm")
+    block = survey.render(s, s.find("midterm_outlook__1"))
+    assert block["title"] == "Mid-term Outlook"
+    assert block["elements"][0]["text"] == "Looking ahead to the rest of the semester for Team A:"
+
+    per_member = surveys.compile_survey(_definition({
+        "kind": "peer_note",
+        "repeat": "members",
+        "title": "{member_name} ({team_name})",
+        "elements": [{"type": "text", "label": "Notes on {member_name} for {mentor_name}{unknown}"}],
+    }), version="1")
+    member = s.members[0]
+    item = per_member.plan(s.members)[1]
+    block = per_member.render(s, item)
+    assert block["title"] == f"{member.name} (Team A)"
+    assert block["elements"][0]["label"] == f"Notes on {member.name} for {s.mentor_name}"
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+from app.data import load_team_data
+from app.teams import load_teams, roster_version, sync_teams
+
+
+def test_roster_round_trip(db):
+    teams = load_team_data()
+    version = sync_teams(teams, None)
+    assert roster_version() == version
+
+    loaded = load_teams()
+    assert set(loaded) == set(teams)
+    for name, team in teams.items():
+        assert loaded[name]["members"] == team["members"]  # ids, names, user_ids, sections
+        mentor = team["mentor_name"]
+        assert loaded[name]["mentor_name"] == (mentor if isinstance(mentor, str) else "")
+    assert any(m.user_id and m.sections for t in loaded.values() for m in t["members"])
+
+
+def test_unchanged_roster_keeps_version(db):
+    version = sync_teams(load_team_data(), None)
+    assert sync_teams(load_team_data(), version) == version
+    assert roster_version() == version
+
+
+def test_partial_sync_removes_departed_teams(db):
+    teams = load_team_data()
+    version = sync_teams(teams, None)
+    gone, changed = sorted(teams)[:2]
+    updated = {name: team for name, team in teams.items() if name != gone}
+    updated[changed] = {**teams[changed], "members": teams[changed]["members"][1:]}
+
+    new_version = sync_teams(updated, version, only={changed})
+    assert new_version != version
+    assert roster_version() == new_version
+    loaded = load_teams()
+    assert gone not in loaded
+    assert loaded[changed]["members"] == teams[changed]["members"][1:]
+    assert set(loaded) == set(updated)
+    assert db.teams.count_documents({"version": new_version}) == 1